@@ -0,0 +1,95 @@
+import argparse
+import time
+import warnings
+
+import lightgbm as lgb
+import numpy as np
+import xgboost as xgb
+from sklearn.model_selection import GridSearchCV, RandomizedSearchCV
+
+from Models.Hyperparameter_Search import make_grid_search, make_search
+from Models.Mask_Search import predict_split
+
+parser = argparse.ArgumentParser(description="Time LightGBM and XGBoost searches and mask predictions through the "
+                                             "scikit-learn wrappers and the native APIs")
+parser.add_argument("--rows", type=int, default=5000, help="Training rows")
+parser.add_argument("--features", type=int, default=30, help="Number of features")
+parser.add_argument("--n_iter", type=int, default=15, help="Configurations per search")
+parser.add_argument("--predict_rows", type=int, default=500, help="Rows of every mask prediction")
+parser.add_argument("--repeats", type=int, default=200, help="Mask predictions per timing")
+
+# The grids of the runners
+LGBM_PARAM_GRID = {'boosting_type': ['gbdt'], 'num_leaves': [10, 20], 'learning_rate': [0.01, 0.1, 0.5],
+                   'n_estimators': [10, 20], 'subsample': [0.6, 0.8, 1.0], 'colsample_bytree': [0.6, 0.8, 1.0],
+                   'min_child_samples': [5, 10]}
+XGB_PARAM_GRID = {'boosting_type': ['gbdt'], 'num_leaves': [20, 50, 100], 'learning_rate': [0.01, 0.1, 0.5],
+                  'n_estimators': [20, 50, 100], 'subsample': [0.6, 0.8, 1.0], 'colsample_bytree': [0.6, 0.8, 1.0],
+                  'min_child_samples': [5, 10]}
+# A grid small enough to search exhaustively
+XGB_SMALL_GRID = {'learning_rate': [0.1, 0.5], 'n_estimators': [20, 50], 'subsample': [0.8, 1.0]}
+
+
+def timed_search(estimator, param_grid, search_mode, n_iter, X, y, fit_params):
+    """Fit one search of search_mode, or a RandomizedSearchCV for "sklearn"; return it and its wall time."""
+    if search_mode == "sklearn":
+        search = RandomizedSearchCV(estimator, param_grid, n_iter=n_iter, cv=5, n_jobs=1, random_state=0)
+    else:
+        search = make_search(estimator, param_grid, search_mode, n_iter=n_iter, n_jobs=1)
+        search.set_params(random_state=0)
+    start = time.perf_counter()
+    search.fit(X, y, **fit_params)
+    return search, time.perf_counter() - start
+
+
+def prediction_time(function, repeats):
+    """Return the mean wall time of repeats calls to function."""
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return (time.perf_counter() - start) / repeats
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+    rng = np.random.RandomState(0)
+    X = rng.randn(args.rows + args.predict_rows, args.features)
+    y = (X[:, :5].sum(axis=1) + rng.randn(len(X)) > 0).astype(int)
+    X_train, y_train, X_val, y_val = X[:args.rows], y[:args.rows], X[args.rows:], y[args.rows:]
+
+    models = {
+        "LightGBM": (lgb.LGBMClassifier(verbosity=-1, n_jobs=1, random_state=0), LGBM_PARAM_GRID,
+                     {"eval_set": (X_val, y_val),
+                      "callbacks": [lgb.early_stopping(10, verbose=0), lgb.log_evaluation(period=0)]}),
+        "XGBoost": (xgb.XGBClassifier(verbosity=0, n_jobs=1, random_state=0), XGB_PARAM_GRID,
+                    {"eval_set": [(X_val, y_val)], "verbose": False}),
+    }
+    for name, (estimator, param_grid, fit_params) in models.items():
+        sklearn_search, sklearn_time = timed_search(estimator, param_grid, "sklearn", args.n_iter, X_train, y_train,
+                                                    fit_params)
+        native_search, native_time = timed_search(estimator, param_grid, "native", args.n_iter, X_train, y_train,
+                                                  fit_params)
+        print(f"{name} search: scikit-learn {sklearn_time:7.2f} s, native {native_time:7.2f} s "
+              f"({sklearn_time / native_time:.2f}x); best CV score {sklearn_search.best_score_:.4f} vs "
+              f"{native_search.best_score_:.4f}; same best parameters: "
+              f"{sklearn_search.best_params_ == native_search.best_params_}")
+
+        if name == "XGBoost":
+            # Train_with_GridSearch of the XGBoost wrappers searches the full grid through the native engine
+            searches, times = [GridSearchCV(estimator, XGB_SMALL_GRID, cv=5, n_jobs=1),
+                               make_grid_search(estimator, XGB_SMALL_GRID, n_jobs=1)], []
+            for search in searches:
+                start = time.perf_counter()
+                search.fit(X_train, y_train, **fit_params)
+                times.append(time.perf_counter() - start)
+            print(f"{name} grid search: scikit-learn {times[0]:7.2f} s, native {times[1]:7.2f} s "
+                  f"({times[0] / times[1]:.2f}x); best CV score {searches[0].best_score_:.4f} vs "
+                  f"{searches[1].best_score_:.4f}; same best parameters: "
+                  f"{searches[0].best_params_ == searches[1].best_params_}")
+
+        model = sklearn_search.best_estimator_
+        wrapper_time = prediction_time(lambda: model.predict_proba(X_val), args.repeats)
+        booster_time = prediction_time(lambda: predict_split(model, X_val, "Classification"), args.repeats)
+        same = np.allclose(model.predict_proba(X_val), predict_split(model, X_val, "Classification"))
+        print(f"{name} mask prediction of {args.predict_rows} rows: predict_proba {wrapper_time * 1e3:.3f} ms, "
+              f"booster {booster_time * 1e3:.3f} ms ({wrapper_time / booster_time:.2f}x); same values: {same}")
@@ -0,0 +1,60 @@
+import argparse
+import time
+
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+
+from Models.Loss_Kernels import fast_log_loss
+
+parser = argparse.ArgumentParser(description="Time the first AFS-BM mask-search iteration on pandas and NumPy inputs")
+parser.add_argument("--rows", type=int, default=5000, help="Rows of the training and mask-validation splits")
+parser.add_argument("--features", type=int, default=50, help="Number of features")
+parser.add_argument("--repeats", type=int, default=3, help="Best-of repeats for every timing")
+
+
+def best_time(function, repeats):
+    """Return the shortest wall time of repeats calls to function."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def first_iteration(model, X_mask_val, y_mask_val, mask):
+    """Score every single-feature drop of mask once, as the first outer iteration of the mask search does."""
+    losses = []
+    for feature in range(len(mask)):
+        candidate_mask = mask.copy()
+        candidate_mask[feature] = 0
+        losses.append(fast_log_loss(y_mask_val, model.predict_proba(X_mask_val * candidate_mask)))
+    return losses
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    rng = np.random.RandomState(0)
+    X = rng.randn(2 * args.rows, args.features)
+    y = (X[:, :5].sum(axis=1) + rng.randn(2 * args.rows) > 0).astype(int)
+    frame = pd.DataFrame(X, columns=[f"feature_{i}" for i in range(args.features)])
+    X_train, X_mask_val = frame.iloc[:args.rows], frame.iloc[args.rows:]
+    y_train, y_mask_val = y[:args.rows], y[args.rows:]
+    mask = np.ones(args.features)
+
+    model = lgb.LGBMClassifier(n_estimators=50, num_leaves=31, verbosity=-1).fit(X_train.to_numpy(), y_train)
+
+    timings = {}
+    timings["masked training split, DataFrame"] = best_time(lambda: X_train * mask, args.repeats)
+    timings["masked training split, ndarray"] = best_time(lambda: X_train.to_numpy() * mask, args.repeats)
+    timings["first iteration, DataFrame"] = best_time(
+        lambda: first_iteration(model, X_mask_val, y_mask_val, mask), args.repeats)
+    X_mask_val_array = np.asarray(X_mask_val)
+    timings["first iteration, ndarray"] = best_time(
+        lambda: first_iteration(model, X_mask_val_array, y_mask_val, mask), args.repeats)
+
+    for name, seconds in timings.items():
+        print(f"{name:<40}{seconds:10.4f} s")
+    print(f"First iteration speedup: "
+          f"{timings['first iteration, DataFrame'] / timings['first iteration, ndarray']:.2f}x")
@@ -0,0 +1,43 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.dummy import DummyClassifier
+
+from Models.Hyperparameter_Search import make_search, search_cache
+from Models.Resource_Manager import shared_arrays, thread_budget
+
+parser = argparse.ArgumentParser(description="Time repeated searches of the same split with and without shared-memory "
+                                             "search data")
+parser.add_argument("--rows", type=int, default=200000, help="Training rows")
+parser.add_argument("--features", type=int, default=50, help="Number of features")
+parser.add_argument("--searches", type=int, default=5, help="Searches of the same split per mode")
+parser.add_argument("--search_jobs", type=int, default=2, help="Parallel fits of every search")
+
+# A model that costs nothing to fit, so that the time of a search is serialization and worker overhead
+PARAM_GRID = {"strategy": ["prior", "most_frequent", "stratified", "uniform"]}
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    rng = np.random.RandomState(0)
+    X = pd.DataFrame(rng.randn(args.rows, args.features), columns=[f"feature_{i}" for i in range(args.features)])
+    y = (X.iloc[:, :5].sum(axis=1) > 0).astype(int).to_numpy()
+    # Every search must be fitted
+    search_cache.directory = None
+    thread_budget.configure(max(thread_budget.n_cores, args.search_jobs), args.search_jobs)
+
+    # Start the worker pool, which is then reused by every search
+    search_cache.fit(make_search(DummyClassifier(), PARAM_GRID, n_iter=4, cv=2), X.iloc[:100], y[:100])
+
+    for enabled in (False, True):
+        shared_arrays.enabled = enabled
+        times = []
+        for _ in range(args.searches):
+            search = make_search(DummyClassifier(random_state=0), PARAM_GRID, n_iter=4, cv=2)
+            start = time.perf_counter()
+            search_cache.fit(search, X, y)
+            times.append(time.perf_counter() - start)
+        print(f"shared memory {'on ' if enabled else 'off'}: first search {times[0]:6.2f} s, "
+              f"later searches of the same split {np.mean(times[1:]):6.2f} s on average")
+    print(f"Shared arrays: {shared_arrays.stats()}")
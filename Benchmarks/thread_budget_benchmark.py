@@ -0,0 +1,50 @@
+import argparse
+import time
+
+import lightgbm as lgb
+import numpy as np
+
+from Models.Hyperparameter_Search import make_search, search_cache
+from Models.Resource_Manager import thread_budget
+
+parser = argparse.ArgumentParser(description="Time a LightGBM random search for every split of the cores between "
+                                             "parallel fits and threads per fit")
+parser.add_argument("--rows", type=int, default=5000, help="Training rows")
+parser.add_argument("--features", type=int, default=50, help="Number of features")
+parser.add_argument("--n_iter", type=int, default=20, help="Configurations of the random search")
+parser.add_argument("--n_cores", type=int, default=None, help="Cores to split (all by default)")
+
+PARAM_GRID = {"num_leaves": [20, 50, 100], "learning_rate": [0.01, 0.1, 0.5], "n_estimators": [20, 50, 100],
+              "subsample": [0.6, 0.8, 1.0], "colsample_bytree": [0.6, 0.8, 1.0], "min_child_samples": [5, 10]}
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    rng = np.random.RandomState(0)
+    X = rng.randn(args.rows, args.features)
+    y = (X[:, :5].sum(axis=1) + rng.randn(args.rows) > 0).astype(int)
+    # Every split must fit the searches
+    search_cache.directory = None
+
+    thread_budget.configure(args.n_cores)
+    n_cores = thread_budget.n_cores
+    timings = {}
+    # None is the default without --search_jobs: n_jobs=-1 and every booster with its own thread count
+    for search_jobs in [None] + [jobs for jobs in range(1, n_cores + 1) if n_cores % jobs == 0]:
+        thread_budget.configure(n_cores, search_jobs)
+        search = make_search(lgb.LGBMClassifier(verbosity=-1, random_state=0), PARAM_GRID, n_iter=args.n_iter)
+        search.set_params(random_state=0)
+        start = time.perf_counter()
+        search_cache.fit(search, X, y)
+        timings[search_jobs] = time.perf_counter() - start
+        if search_jobs is None:
+            print(f"default (n_jobs=-1, unlimited booster threads): {timings[search_jobs]:8.2f} s")
+        else:
+            print(f"{search_jobs:4d} parallel fits x {thread_budget.threads_per_job:3d} threads: "
+                  f"{timings[search_jobs]:8.2f} s")
+
+    best = min(timings, key=timings.get)
+    if best is None:
+        print(f"Best on {n_cores} cores: the default, without --search_jobs")
+    else:
+        print(f"Best split on {n_cores} cores: --search_jobs {best} ({n_cores // best} threads per fit) "
+              f"({timings[None] / timings[best]:.2f}x the default)")
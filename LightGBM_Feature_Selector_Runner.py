@@ -12,6 +12,9 @@ from DataLoaders.Dataset_Picker import Create_Dataset
 from DataLoaders.time_series_dataloader import Create_Dataloader
 from Models.Feature_Selector_LightGBM import Feature_Selector_LGBM
 from Models.Feature_Selector_XGB import Feature_Selector_XGB
+from Models.Hyperparameter_Search import search_cache
+from Models.LightGBM_Engine import dataset_cache
+from Models.Resource_Manager import thread_budget
 from Models.LightGBM_Pipeline import Baseline_LightGBM_Model
 from Models.XGBoost_Pipeline import Baseline_XgBoost_Model
 from Models.Cross_Corr_LightGBM import Cross_Corr_LightGBM
@@ -47,10 +50,35 @@ set_random_seeds(222)
 parser = argparse.ArgumentParser()
 parser.add_argument("--dataset_name", type=str, default="statlog_aca", help="Dataset name")
 parser.add_argument("--type", type=str, default="Classification", help="Type of dataset")
+parser.add_argument("--warm_start", action="store_true",
+                    help="Refit the previous best hyperparameters between AFS-BM iterations instead of searching")
+parser.add_argument("--search_mode", type=str, default="random", choices=["random", "halving", "binned", "native"],
+                    help="Hyperparameter search of the AFS-BM selectors and baselines: random search, successive "
+                         "halving, random search on LightGBM datasets binned once (LightGBM models only) or random "
+                         "search through the native LightGBM and XGBoost APIs. The XGBoost models search through "
+                         "the native XGBoost API with random and native")
+parser.add_argument("--search_cache", type=str, default=None,
+                    help="Directory of the hyperparameter search cache (disabled by default). The searches are not "
+                         "seeded, so a cached search replays the random draw of the run that stored it")
+parser.add_argument("--dataset_cache", type=str, default=None,
+                    help="Directory to save the binned LightGBM datasets of --search_mode binned to, for later runs "
+                         "(in memory only by default). Every split and set of binning parameters adds a file")
+parser.add_argument("--n_cores", type=int, default=None, help="Cores to split with --search_jobs (all by default)")
+parser.add_argument("--search_jobs", type=int, default=None,
+                    help="Hyperparameter-search fits run in parallel, each with n_cores // search_jobs threads. By "
+                         "default searches use n_jobs=-1 and every fit its own thread count; "
+                         "Benchmarks/thread_budget_benchmark.py times the splits")
 
 if __name__ == '__main__':
     dataset_name = parser.parse_args().dataset_name
     data_type = parser.parse_args().type
+    warm_start = parser.parse_args().warm_start
+    search_mode = parser.parse_args().search_mode
+    # The binned search only exists for LightGBM, the XGBoost models use random search with it
+    xgb_search_mode = "random" if search_mode == "binned" else search_mode
+    search_cache.directory = parser.parse_args().search_cache or None
+    dataset_cache.directory = parser.parse_args().dataset_cache or None
+    thread_budget.configure(parser.parse_args().n_cores, parser.parse_args().search_jobs)
 
     directory_name = f"{data_type}/{dataset_name}"
 
@@ -91,7 +119,8 @@ if __name__ == '__main__':
                                             X_train=X_train, X_val=X_val,
                                             X_val_mask=X_val_mask, X_test=X_test, y_train=y_train,
                                             y_val=y_val, y_val_mask=y_val_mask, y_test=y_test,
-                                            data_type="Classification", dir_name=directory_name)
+                                            data_type="Classification", dir_name=directory_name,
+                                            warm_start=warm_start, search_mode=search_mode)
 
             network.fit_network()
             test_loss = network.Test_Network()
@@ -113,7 +142,8 @@ if __name__ == '__main__':
                                            X_train=X_train, X_val=X_val,
                                            X_val_mask=X_val_mask, X_test=X_test, y_train=y_train,
                                            y_val=y_val, y_val_mask=y_val_mask, y_test=y_test,
-                                           data_type="Classification", dir_name=directory_name)
+                                           data_type="Classification", dir_name=directory_name,
+                                           warm_start=warm_start, search_mode=xgb_search_mode)
 
             network.fit_network()
             test_loss = network.Test_Network()
@@ -137,7 +167,8 @@ if __name__ == '__main__':
                                                             },
                                                             X_train=X_train, X_val=X_val, X_test=X_test,
                                                             y_train=y_train, y_val=y_val, y_test=y_test,
-                                                            data_type="Classification", dir_name=directory_name)
+                                                            data_type="Classification", dir_name=directory_name,
+                                                            search_mode=search_mode)
 
             baseline_network_lgbm.Train_with_RandomSearch()
             best_params_xgboost = baseline_network_lgbm.best_params
@@ -162,7 +193,8 @@ if __name__ == '__main__':
                                                                 },
                                                                 X_train=X_train, X_val=X_val, X_test=X_test,
                                                                 y_train=y_train, y_val=y_val, y_test=y_test,
-                                                                data_type="Classification", dir_name=directory_name)
+                                                                data_type="Classification", dir_name=directory_name,
+                                                                search_mode=xgb_search_mode)
 
             baseline_network_xgboost.Train_with_RandomSearch()
             test_xgboost_baseline_loss = baseline_network_xgboost.Test_Network()
@@ -184,7 +216,8 @@ if __name__ == '__main__':
                                     },
                                     X_train=X_train, X_val=X_val, X_test=X_test,
                                     y_train=y_train, y_val=y_val, y_test=y_test,
-                                    data_type="Classification", dir_name=directory_name)
+                                    data_type="Classification", dir_name=directory_name,
+                                    search_mode=search_mode)
 
             rfe_lgbm.Train_with_RandomSearch()
             test_lgbm_rfe_loss = rfe_lgbm.Test_Network()
@@ -206,7 +239,8 @@ if __name__ == '__main__':
                               },
                               X_train=X_train, X_val=X_val, X_test=X_test,
                               y_train=y_train, y_val=y_val, y_test=y_test,
-                              data_type="Classification", dir_name=directory_name)
+                              data_type="Classification", dir_name=directory_name,
+                              search_mode=xgb_search_mode)
 
             rfe_xgb.Train_with_RandomSearch()
             test_xgboost_rfe_loss = rfe_xgb.Test_Network()
@@ -229,7 +263,8 @@ if __name__ == '__main__':
                                                   },
                                                   X_train=X_train, X_val=X_val, X_test=X_test,
                                                   y_train=y_train, y_val=y_val, y_test=y_test,
-                                                  data_type="Classification", dir_name=directory_name)
+                                                  data_type="Classification", dir_name=directory_name,
+                                                  search_mode=search_mode)
 
             cross_corr_lgbm.Train_with_RandomSearch()
             test_lgbm_cross_corr_loss = cross_corr_lgbm.Test_Network()
@@ -252,7 +287,8 @@ if __name__ == '__main__':
                 },
                 X_train=X_train, X_val=X_val, X_test=X_test,
                 y_train=y_train, y_val=y_val, y_test=y_test,
-                data_type="Classification", dir_name=directory_name)
+                data_type="Classification", dir_name=directory_name,
+                search_mode=xgb_search_mode)
 
             cross_corr_xgb.Train_with_RandomSearch()
             test_xgboost_cross_corr_loss = cross_corr_xgb.Test_Network()
@@ -274,7 +310,8 @@ if __name__ == '__main__':
                                                   },
                                                   X_train=X_train, X_val=X_val, X_test=X_test,
                                                   y_train=y_train, y_val=y_val, y_test=y_test,
-                                                  data_type="Classification", dir_name=directory_name)
+                                                  data_type="Classification", dir_name=directory_name,
+                                                  search_mode=search_mode)
 
             mutual_inf_lgbm.Train_with_RandomSearch()
             test_lgbm_mutual_inf_loss = mutual_inf_lgbm.Test_Network()
@@ -296,7 +333,8 @@ if __name__ == '__main__':
                                             },
                                             X_train=X_train, X_val=X_val, X_test=X_test,
                                             y_train=y_train, y_val=y_val, y_test=y_test,
-                                            data_type="Classification", dir_name=directory_name)
+                                            data_type="Classification", dir_name=directory_name,
+                                            search_mode=xgb_search_mode)
 
             mutual_inf_xgb.Train_with_RandomSearch()
             test_xgboost_mutual_inf_loss = mutual_inf_xgb.Test_Network()
@@ -370,7 +408,8 @@ if __name__ == '__main__':
                                             X_train=X_train, X_val=X_val,
                                             X_val_mask=X_val_mask, X_test=X_test, y_train=y_train,
                                             y_val=y_val, y_val_mask=y_val_mask, y_test=y_test,
-                                            data_type="Regression", dir_name=directory_name)
+                                            data_type="Regression", dir_name=directory_name,
+                                            warm_start=warm_start, search_mode=search_mode)
 
             network.fit_network()
             test_loss = network.Test_Network()
@@ -392,7 +431,8 @@ if __name__ == '__main__':
                                            X_train=X_train, X_val=X_val,
                                            X_val_mask=X_val_mask, X_test=X_test, y_train=y_train,
                                            y_val=y_val, y_val_mask=y_val_mask, y_test=y_test,
-                                           data_type="Regression", dir_name=directory_name)
+                                           data_type="Regression", dir_name=directory_name,
+                                           warm_start=warm_start, search_mode=xgb_search_mode)
 
             network.fit_network()
             test_loss = network.Test_Network()
@@ -416,7 +456,8 @@ if __name__ == '__main__':
                                                             },
                                                             X_train=X_train, X_val=X_val, X_test=X_test,
                                                             y_train=y_train, y_val=y_val, y_test=y_test,
-                                                            data_type="Regression", dir_name=directory_name)
+                                                            data_type="Regression", dir_name=directory_name,
+                                                            search_mode=search_mode)
 
             baseline_network_lgbm.Train_with_RandomSearch()
             best_params_xgboost = baseline_network_lgbm.best_params
@@ -442,7 +483,8 @@ if __name__ == '__main__':
                 },
                 X_train=X_train, X_val=X_val, X_test=X_test,
                 y_train=y_train, y_val=y_val, y_test=y_test,
-                data_type="Regression", dir_name=directory_name)
+                data_type="Regression", dir_name=directory_name,
+                search_mode=xgb_search_mode)
 
             baseline_network_xgboost.Train_with_RandomSearch()
             test_xgboost_baseline_loss.append(baseline_network_xgboost.Test_Network())
@@ -464,7 +506,8 @@ if __name__ == '__main__':
                                     },
                                     X_train=X_train, X_val=X_val, X_test=X_test,
                                     y_train=y_train, y_val=y_val, y_test=y_test,
-                                    data_type="Regression", dir_name=directory_name)
+                                    data_type="Regression", dir_name=directory_name,
+                                    search_mode=search_mode)
 
             rfe_lgbm.Train_with_RandomSearch()
             test_lgbm_rfe_loss.append(rfe_lgbm.Test_Network())
@@ -486,7 +529,8 @@ if __name__ == '__main__':
                               },
                               X_train=X_train, X_val=X_val, X_test=X_test,
                               y_train=y_train, y_val=y_val, y_test=y_test,
-                              data_type="Regression", dir_name=directory_name)
+                              data_type="Regression", dir_name=directory_name,
+                              search_mode=xgb_search_mode)
 
             rfe_xgb.Train_with_RandomSearch()
             test_xgboost_rfe_loss.append(rfe_xgb.Test_Network())
@@ -509,7 +553,8 @@ if __name__ == '__main__':
                                                   },
                                                   X_train=X_train, X_val=X_val, X_test=X_test,
                                                   y_train=y_train, y_val=y_val, y_test=y_test,
-                                                  data_type="Regression", dir_name=directory_name)
+                                                  data_type="Regression", dir_name=directory_name,
+                                                  search_mode=search_mode)
 
             cross_corr_lgbm.Train_with_RandomSearch()
             test_lgbm_cross_corr_loss.append(cross_corr_lgbm.Test_Network())
@@ -532,7 +577,8 @@ if __name__ == '__main__':
                 },
                 X_train=X_train, X_val=X_val, X_test=X_test,
                 y_train=y_train, y_val=y_val, y_test=y_test,
-                data_type="Regression", dir_name=directory_name)
+                data_type="Regression", dir_name=directory_name,
+                search_mode=xgb_search_mode)
 
             cross_corr_xgb.Train_with_RandomSearch()
             test_xgboost_cross_corr_loss.append(cross_corr_xgb.Test_Network())
@@ -554,7 +600,8 @@ if __name__ == '__main__':
                                                   },
                                                   X_train=X_train, X_val=X_val, X_test=X_test,
                                                   y_train=y_train, y_val=y_val, y_test=y_test,
-                                                  data_type="Regression", dir_name=directory_name)
+                                                  data_type="Regression", dir_name=directory_name,
+                                                  search_mode=search_mode)
 
             mutual_inf_lgbm.Train_with_RandomSearch()
             test_lgbm_mutual_inf_loss.append(mutual_inf_lgbm.Test_Network())
@@ -576,7 +623,8 @@ if __name__ == '__main__':
                                             },
                                             X_train=X_train, X_val=X_val, X_test=X_test,
                                             y_train=y_train, y_val=y_val, y_test=y_test,
-                                            data_type="Regression", dir_name=directory_name)
+                                            data_type="Regression", dir_name=directory_name,
+                                            search_mode=xgb_search_mode)
 
             mutual_inf_xgb.Train_with_RandomSearch()
             test_xgboost_mutual_inf_loss.append(mutual_inf_xgb.Test_Network())
@@ -12,9 +12,11 @@ from DataLoaders.Dataset_Picker import Create_Dataset
 from DataLoaders.time_series_dataloader import Create_Dataloader
 from Models.Cross_Corr_MLP import Cross_Corr_MLP
 from Models.Feature_Selector_MLP import Feature_Selector_MLP
+from Models.Hyperparameter_Search import search_cache
 from Models.MLP_Pipeline import Baseline_MLP_Model
 from Models.Mutual_Inf_MLP import Mutual_Inf_MLP
 from Models.RFE_MLP import RFE_MLP
+from Models.Resource_Manager import thread_budget
 
 
 def set_random_seeds(seed):
@@ -41,10 +43,26 @@ set_random_seeds(222)
 parser = argparse.ArgumentParser()
 parser.add_argument("--dataset_name", type=str, default="statlog_aca", help="Dataset name")
 parser.add_argument("--type", type=str, default="Classification", help="Type of dataset")
+parser.add_argument("--warm_start", action="store_true",
+                    help="Refit the previous best hyperparameters between AFS-BM iterations instead of searching")
+parser.add_argument("--search_mode", type=str, default="random", choices=["random", "halving"],
+                    help="Hyperparameter search of the AFS-BM selectors: random search or successive halving")
+parser.add_argument("--search_cache", type=str, default=None,
+                    help="Directory of the hyperparameter search cache (disabled by default). The searches are not "
+                         "seeded, so a cached search replays the random draw of the run that stored it")
+parser.add_argument("--n_cores", type=int, default=None, help="Cores to split with --search_jobs (all by default)")
+parser.add_argument("--search_jobs", type=int, default=None,
+                    help="Hyperparameter-search fits run in parallel, each with n_cores // search_jobs threads. By "
+                         "default searches use n_jobs=-1 and every fit its own thread count; "
+                         "Benchmarks/thread_budget_benchmark.py times the splits")
 
 if __name__ == '__main__':
     dataset_name = parser.parse_args().dataset_name
     data_type = parser.parse_args().type
+    warm_start = parser.parse_args().warm_start
+    search_mode = parser.parse_args().search_mode
+    search_cache.directory = parser.parse_args().search_cache or None
+    thread_budget.configure(parser.parse_args().n_cores, parser.parse_args().search_jobs)
 
     directory_name = f"{data_type}/{dataset_name}"
 
@@ -81,7 +99,8 @@ if __name__ == '__main__':
                                            X_train=X_train, X_val=X_val,
                                            X_val_mask=X_val_mask, X_test=X_test, y_train=y_train,
                                            y_val=y_val, y_val_mask=y_val_mask, y_test=y_test,
-                                           data_type="Classification", dir_name=directory_name)
+                                           data_type="Classification", dir_name=directory_name,
+                                           warm_start=warm_start, search_mode=search_mode)
 
             fit_network = network.fit_network()
             test_fs_MLP_model_loss = network.Test_Network()
@@ -198,7 +217,8 @@ if __name__ == '__main__':
                                            X_train=X_train, X_val=X_val,
                                            X_val_mask=X_val_mask, X_test=X_test, y_train=y_train,
                                            y_val=y_val, y_val_mask=y_val_mask, y_test=y_test,
-                                           data_type="Regression", dir_name=directory_name)
+                                           data_type="Regression", dir_name=directory_name,
+                                           warm_start=warm_start, search_mode=search_mode)
 
             network.fit_network()
             test_loss = network.Test_Network()
@@ -0,0 +1,54 @@
+import numpy as np
+
+
+class ColumnStore:
+    """Feature matrices of the splits of one dataset, held once and column-major, with a shared set of active columns.
+
+    A split that is already column-major in dtype, such as a single-dtype DataFrame, is held as a view of the caller's
+    data, and is never written to. Dropping columns only updates the active column index. The next time a split is
+    requested, its remaining columns are copied into a new contiguous (Fortran-ordered) buffer, so matrices returned
+    before a drop stay valid.
+    """
+
+    def __init__(self, splits, dtype=None):
+        self._arrays = {}
+        self._layouts = {}
+        n_columns = None
+        for name, X in splits.items():
+            X = np.asarray(X, dtype=dtype, order="F")
+            if X.ndim != 2:
+                raise ValueError(f"Split {name} must be a 2-D matrix, got shape {X.shape}")
+            if n_columns is None:
+                n_columns = X.shape[1]
+            elif X.shape[1] != n_columns:
+                raise ValueError(f"Split {name} has {X.shape[1]} columns, expected {n_columns}")
+            self._arrays[name] = X
+        self.columns = np.arange(n_columns or 0)
+        for name in self._arrays:
+            self._layouts[name] = self.columns
+
+    @property
+    def dtype(self):
+        """The dtype of the feature matrices, that of the training split."""
+        return next(iter(self._arrays.values())).dtype
+
+    @property
+    def n_columns(self):
+        return len(self.columns)
+
+    def drop(self, positions):
+        """Remove the columns at the given positions of the current matrices."""
+        keep = np.ones(len(self.columns), dtype=bool)
+        keep[positions] = False
+        self.columns = self.columns[keep]
+
+    def split(self, name):
+        """Return the matrix of split name restricted to the active columns."""
+        X = self._arrays[name]
+        layout = self._layouts[name]
+        if layout is not self.columns:
+            # Both are sorted original column ids and columns is a subset of layout
+            X = np.asfortranarray(X[:, np.searchsorted(layout, self.columns)])
+            self._arrays[name] = X
+            self._layouts[name] = self.columns
+        return X
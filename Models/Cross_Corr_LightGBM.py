@@ -3,10 +3,12 @@ import numpy as np
 import torch
 import random
 import datetime
-from sklearn.metrics import log_loss, mean_squared_error
-from sklearn.model_selection import RandomizedSearchCV, GridSearchCV
+from sklearn.model_selection import GridSearchCV
 import pandas as pd
 
+from Models.Hyperparameter_Search import make_search, search_cache
+from Models.Loss_Kernels import fast_log_loss, fast_mean_squared_error
+
 
 def set_random_seeds(seed):
     """Set random seed for reproducibility across different libraries."""
@@ -34,7 +36,7 @@ class Cross_Corr_LightGBM:
     """Wrapper for LightGBM model with utility functions."""
 
     def __init__(self, params, param_grid, X_train, X_val, X_test, y_train, y_val, y_test,
-                 data_type, dir_name):
+                 data_type, dir_name, search_mode="random"):
         # Initialization with dataset and parameters
         self.params = params
         self.param_grid = param_grid
@@ -46,6 +48,7 @@ class Cross_Corr_LightGBM:
         self.y_test = y_test
         self.data_type = data_type
         self.dir_name = dir_name
+        self.search_mode = search_mode
 
         self.X_train_mi = X_train
         self.X_val_mi = X_val
@@ -82,16 +85,15 @@ class Cross_Corr_LightGBM:
             self.X_test_mi = self.X_test[selected_features]
 
     def Train_with_RandomSearch(self):
-        """Train the model using random search for hyperparameter optimization."""
+        """Train the model using random search, successive halving or the binned search, as search_mode selects."""
         best_loss = np.inf
         best_threshold = 10000
         for threshold in [0.02, 0.03, 0.04, 0.05, 0.10, 0.15, 0.20, 0.25, 0.30, 0.35]:
             self.Calc_Cross_Corr(threshold)
-            random_search = RandomizedSearchCV(self.base_model, param_distributions=self.param_grid, n_iter=100, cv=5,
-                                               verbose=-1, n_jobs=-1)
+            random_search = make_search(self.base_model, self.param_grid, self.search_mode, n_iter=100)
             callbacks = [lgb.early_stopping(10, verbose=0), lgb.log_evaluation(period=0)]
-            random_search.fit(self.X_train_mi, self.y_train, eval_set=(self.X_val_mi, self.y_val),
-                              callbacks=callbacks)
+            search_cache.fit(random_search, self.X_train_mi, self.y_train, eval_set=(self.X_val_mi, self.y_val),
+                             callbacks=callbacks)
             self.best_params = random_search.best_params_
             self.searched_trained_model = random_search.best_estimator_
             loss = random_search.best_score_
@@ -100,11 +102,10 @@ class Cross_Corr_LightGBM:
                 best_threshold = threshold
 
         self.Calc_Cross_Corr(best_threshold, best=True)
-        random_search = RandomizedSearchCV(self.base_model, param_distributions=self.param_grid, n_iter=100, cv=5,
-                                           verbose=-1, n_jobs=-1)
+        random_search = make_search(self.base_model, self.param_grid, self.search_mode, n_iter=100)
         callbacks = [lgb.early_stopping(10, verbose=0), lgb.log_evaluation(period=0)]
-        random_search.fit(self.X_train, self.y_train, eval_set=(self.X_val, self.y_val),
-                          callbacks=callbacks)
+        search_cache.fit(random_search, self.X_train, self.y_train, eval_set=(self.X_val, self.y_val),
+                         callbacks=callbacks)
         self.best_params = random_search.best_params_
         self.searched_trained_model = random_search.best_estimator_
 
@@ -115,10 +116,10 @@ class Cross_Corr_LightGBM:
         best_threshold = 10000
         for threshold in [0.02, 0.03, 0.04, 0.05, 0.10, 0.15, 0.20, 0.25, 0.30, 0.35]:
             self.Calc_Cross_Corr(threshold)
-            grid_search = GridSearchCV(self.base_model, param_grid=self.param_grid, cv=5, verbose=-1, n_jobs=-1)
+            grid_search = GridSearchCV(self.base_model, param_grid=self.param_grid, cv=5, verbose=0, n_jobs=-1)
             callbacks = [lgb.early_stopping(10, verbose=0), lgb.log_evaluation(period=0)]
-            grid_search.fit(self.X_train_mi, self.y_train, eval_set=(self.X_val_mi, self.y_val),
-                            callbacks=callbacks)
+            search_cache.fit(grid_search, self.X_train_mi, self.y_train, eval_set=(self.X_val_mi, self.y_val),
+                             callbacks=callbacks)
             self.best_params = grid_search.best_params_
             self.searched_trained_model = grid_search.best_estimator_
             loss = grid_search.best_score_
@@ -127,10 +128,10 @@ class Cross_Corr_LightGBM:
                 best_threshold = threshold
 
         self.Calc_Cross_Corr(best_threshold, best=True)
-        grid_search = GridSearchCV(self.base_model, param_grid=self.param_grid, cv=5, verbose=-1, n_jobs=-1)
+        grid_search = GridSearchCV(self.base_model, param_grid=self.param_grid, cv=5, verbose=0, n_jobs=-1)
         callbacks = [lgb.early_stopping(10, verbose=0), lgb.log_evaluation(period=0)]
-        grid_search.fit(self.X_train, self.y_train, eval_set=(self.X_val, self.y_val),
-                        callbacks=callbacks)
+        search_cache.fit(grid_search, self.X_train, self.y_train, eval_set=(self.X_val, self.y_val),
+                         callbacks=callbacks)
         self.best_params = grid_search.best_params_
         self.searched_trained_model = grid_search.best_estimator_
 
@@ -160,9 +161,9 @@ class Cross_Corr_LightGBM:
     @staticmethod
     def cross_entropy(preds, labels):
         """Compute cross entropy loss."""
-        return log_loss(labels, preds)
+        return fast_log_loss(labels, preds)
 
     @staticmethod
     def mean_squared_error(preds, labels):
         """Compute mean squared error."""
-        return mean_squared_error(labels, preds)
+        return fast_mean_squared_error(labels, preds)
@@ -5,8 +5,10 @@ import numpy as np
 import pandas as pd
 import torch
 import xgboost as xgb
-from sklearn.metrics import log_loss, mean_squared_error
-from sklearn.model_selection import RandomizedSearchCV, GridSearchCV
+
+from Models.Hyperparameter_Search import make_search, search_cache
+from Models.Loss_Kernels import fast_log_loss, fast_mean_squared_error
+from Models.XGBoost_Engine import device_params
 
 
 def set_random_seeds(seed):
@@ -35,7 +37,7 @@ class Cross_Corr_XGB:
     """Wrapper for XgBoost model with utility functions."""
 
     def __init__(self, params, param_grid, X_train, X_val, X_test, y_train, y_val, y_test,
-                 data_type, dir_name):
+                 data_type, dir_name, search_mode="random"):
         # Initialization with dataset and parameters
         self.params = params
         self.param_grid = param_grid
@@ -47,15 +49,16 @@ class Cross_Corr_XGB:
         self.y_test = y_test
         self.data_type = data_type
         self.dir_name = dir_name
+        self.search_mode = search_mode
 
         if data_type == "Classification":
-            self.base_model = xgb.XGBClassifier(**self.params, device="cuda", tree_method="gpu_hist")
+            self.base_model = xgb.XGBClassifier(**device_params(self.params))
             self.params["eval_metric"] = ["logloss"]
             self.params["objective"] = ["binary"]
             self.criterion = self.cross_entropy
 
         else:
-            self.base_model = xgb.XGBRegressor(**self.params, device="cuda", tree_method="gpu_hist")
+            self.base_model = xgb.XGBRegressor(**device_params(self.params))
             self.params["eval_metric"] = ["l2"]
             self.params["objective"] = ["regression"]
             self.criterion = self.mean_squared_error
@@ -79,14 +82,14 @@ class Cross_Corr_XGB:
             self.X_test_mi = self.X_test[selected_features]
 
     def Train_with_RandomSearch(self):
-        """Train the model using random search for hyperparameter optimization."""
+        """Train the model using random search, successive halving or the native search, as search_mode selects."""
         best_loss = np.inf
         best_threshold = 10000
         for threshold in [0.02, 0.03, 0.04, 0.05, 0.10, 0.15, 0.20, 0.25, 0.30, 0.35]:
             self.Calc_Cross_Corr(threshold)
-            random_search = RandomizedSearchCV(self.base_model, param_distributions=self.param_grid, n_iter=15, cv=5,
-                                               verbose=-1, n_jobs=-1)
-            random_search.fit(self.X_train_mi, self.y_train, eval_set=[(self.X_val_mi, self.y_val)], verbose=False)
+            random_search = make_search(self.base_model, self.param_grid, self.search_mode, n_iter=15)
+            search_cache.fit(random_search, self.X_train_mi, self.y_train,
+                             eval_set=[(self.X_val_mi, self.y_val)], verbose=False)
             self.best_params = random_search.best_params_
             self.searched_trained_model = random_search.best_estimator_
             loss = random_search.best_score_
@@ -95,9 +98,8 @@ class Cross_Corr_XGB:
                 best_threshold = threshold
 
         self.Calc_Cross_Corr(best_threshold, best=True)
-        random_search = RandomizedSearchCV(self.base_model, param_distributions=self.param_grid, n_iter=15, cv=5,
-                                           verbose=-1, n_jobs=-1)
-        random_search.fit(self.X_train, self.y_train, eval_set=[(self.X_val, self.y_val)], verbose=False)
+        random_search = make_search(self.base_model, self.param_grid, self.search_mode, n_iter=15)
+        search_cache.fit(random_search, self.X_train, self.y_train, eval_set=[(self.X_val, self.y_val)], verbose=False)
         self.best_params = random_search.best_params_
         self.searched_trained_model = random_search.best_estimator_
 
@@ -108,9 +110,9 @@ class Cross_Corr_XGB:
         best_threshold = 10000
         for threshold in [0.02, 0.03, 0.04, 0.05, 0.10, 0.15, 0.20, 0.25, 0.30, 0.35, 0.40, 0.45, 0.5]:
             self.Calc_Cross_Corr(threshold)
-            random_search = RandomizedSearchCV(self.base_model, param_distributions=self.param_grid, n_iter=15, cv=5,
-                                               verbose=-1, n_jobs=-1)
-            random_search.fit(self.X_train_mi, self.y_train, eval_set=[(self.X_val_mi, self.y_val)], verbose=False)
+            random_search = make_search(self.base_model, self.param_grid, self.search_mode, n_iter=15)
+            search_cache.fit(random_search, self.X_train_mi, self.y_train,
+                             eval_set=[(self.X_val_mi, self.y_val)], verbose=False)
             self.best_params = random_search.best_params_
             self.searched_trained_model = random_search.best_estimator_
             loss = random_search.best_score_
@@ -119,9 +121,8 @@ class Cross_Corr_XGB:
                 best_threshold = threshold
 
         self.Calc_Cross_Corr(best_threshold, best=True)
-        random_search = RandomizedSearchCV(self.base_model, param_distributions=self.param_grid, n_iter=15, cv=5,
-                                           verbose=-1, n_jobs=-1)
-        random_search.fit(self.X_train, self.y_train, eval_set=[(self.X_val, self.y_val)], verbose=False)
+        random_search = make_search(self.base_model, self.param_grid, self.search_mode, n_iter=15)
+        search_cache.fit(random_search, self.X_train, self.y_train, eval_set=[(self.X_val, self.y_val)], verbose=False)
         self.best_params = random_search.best_params_
         self.searched_trained_model = random_search.best_estimator_
 
@@ -152,9 +153,9 @@ class Cross_Corr_XGB:
     @staticmethod
     def cross_entropy(preds, labels):
         """Compute cross entropy loss."""
-        return log_loss(labels, preds)
+        return fast_log_loss(labels, preds)
 
     @staticmethod
     def mean_squared_error(preds, labels):
         """Compute mean squared error."""
-        return mean_squared_error(labels, preds)
+        return fast_mean_squared_error(labels, preds)
@@ -5,8 +5,17 @@ import datetime
 import numpy as np
 import torch
 import xgboost as xgb
-from sklearn.metrics import classification_report, accuracy_score, log_loss, mean_squared_error
-from sklearn.model_selection import GridSearchCV, RandomizedSearchCV
+from sklearn.base import clone
+from sklearn.metrics import classification_report, accuracy_score
+from sklearn.utils import check_random_state
+
+from Models.Column_Store import ColumnStore
+from Models.Hyperparameter_Search import make_grid_search, make_search, search_cache
+from Models.Loss_Kernels import fast_log_loss, fast_mean_squared_error
+from Models.Mask_Search import (CandidateScheduler, GroupCandidateScheduler, MaskScorer, mask_prediction_cache,
+                                scoring_pool)
+from Models.Tree_Evaluator import ContributionScreen, FeatureUsageIndex, make_tree_mask_scorer
+from Models.XGBoost_Engine import device_params
 
 # Suppress warnings
 warnings.filterwarnings("ignore")
@@ -70,48 +79,103 @@ class Feature_Selector_XGB:
     """Feature selection using XgBoost."""
 
     def __init__(self, params, param_grid, X_train, X_val, X_val_mask, X_test, y_train, y_val, y_val_mask, y_test,
-                 data_type,dir_name):
+                 data_type,dir_name, mask_batch_size=1, n_mask_jobs=1,
+                 warm_start=False, warm_start_tolerance=0.01, prediction_cache=None,
+                 reuse_unchanged_model=True, incremental_trees=False,
+                 drop_unused_features=False, candidate_ordering="random", candidate_seed=None,
+                 group_elimination=False, contrib_screening=False, screening_margin=0.5,
+                 racing_rows=0, racing_confidence=0.99, abort_rows=0,
+                 feature_dtype=None, search_mode="random"):
         self.params = params
         self.param_grid = param_grid
+        # Column names are only kept for reporting, the selection runs on NumPy arrays
+        self.col_names = np.asarray(getattr(X_train, "columns", np.arange(np.shape(X_train)[1])))
+        # The feature matrices are passed on as given; the model wrapper holds them in a ColumnStore
         self.X_train = X_train
-        self.y_train = y_train
+        self.y_train = np.asarray(y_train)
         self.X_val = X_val
-        self.y_val = y_val
+        self.y_val = np.asarray(y_val)
         self.X_val_mask = X_val_mask
-        self.y_val_mask = y_val_mask
+        self.y_val_mask = np.asarray(y_val_mask)
         self.X_test = X_test
-        self.y_test = y_test
+        self.y_test = np.asarray(y_test)
         self.data_type = data_type
-        self.num_of_features = self.X_train.shape[1]
+        self.num_of_features = np.shape(X_train)[1]
         self.dir_name = dir_name
-        self.col_names = X_train.columns
-
-        self.mask = np.ones(self.X_train.shape[1])
+        self.mask_batch_size = mask_batch_size
+        self.n_mask_jobs = n_mask_jobs
+        self.warm_start = warm_start
+        self.warm_start_tolerance = warm_start_tolerance
+        self.prediction_cache = mask_prediction_cache if prediction_cache is None else prediction_cache
+        self.reuse_unchanged_model = reuse_unchanged_model
+        self.incremental_trees = incremental_trees
+        self.drop_unused_features = drop_unused_features
+        self.candidate_ordering = candidate_ordering
+        self.candidate_seed = candidate_seed
+        self.group_elimination = group_elimination
+        self.contrib_screening = contrib_screening
+        self.screening_margin = screening_margin
+        self.racing_rows = racing_rows
+        self.racing_confidence = racing_confidence
+        self.abort_rows = abort_rows
+        self.feature_dtype = feature_dtype
+        self.search_mode = search_mode
+
+        self.mask = np.ones(self.num_of_features, dtype=feature_dtype)
 
         if data_type == "Classification":
-            self.base_model = xgb.XGBClassifier(**self.params)
+            self.base_model = xgb.XGBClassifier(**device_params(self.params))
 
         else:
-            self.base_model = xgb.XGBRegressor(**self.params)
+            self.base_model = xgb.XGBRegressor(**device_params(self.params))
+
+    def candidate_scores(self, usage, X):
+        """Return the scores the mask search tries features in ascending order of, or None for a random order.
+
+        "split" and "gain" are the split count and total gain of each feature in the trained trees, "importance" is
+        the model's feature_importances_ and "contrib" the mean absolute SHAP contribution of each feature on X.
+        """
+        if self.candidate_ordering == "random":
+            return None
+        if self.candidate_ordering == "split":
+            return usage.split_counts
+        if self.candidate_ordering == "gain":
+            return usage.total_gain
+        if self.candidate_ordering == "importance":
+            return self.model.feature_importances_
+        if self.candidate_ordering == "contrib":
+            booster = self.model.get_booster()
+            contrib = booster.predict(xgb.DMatrix(X, feature_names=booster.feature_names), pred_contribs=True)
+            # One block of n_features contributions plus the bias per output
+            return np.abs(contrib).reshape(len(X), -1, X.shape[1] + 1)[..., :-1].mean(axis=(0, 1))
+        raise ValueError(f"Unknown candidate ordering {self.candidate_ordering}")
 
     def fit_network(self):
         """Fit the XGBoost model and perform feature selection."""
+        # One pool of mask-scoring workers serves every outer iteration, and is shut down even if the selection fails
+        with scoring_pool(self.n_mask_jobs) as pool:
+            self._fit_network(pool)
+
+    def _fit_network(self, pool):
         mask_cache = []
         train_loss_cache = []
         mask_loss_cache = []
         full_loss_cache = []
         final_loss_cache = []
         mask_optim_patience = 0
+        candidate_random_state = check_random_state(self.candidate_seed)
         iter = 0
         training_iter = 0
-        self.MAX_TRAINING_ITERATIONS = 2 * self.X_train.shape[1]
+        self.MAX_TRAINING_ITERATIONS = 2 * np.shape(self.X_train)[1]
 
         XGBoost_Selector = XGBoost_Model(self.params, self.param_grid,
                                          self.X_train, self.X_val, self.X_val_mask, self.X_test,
                                          self.y_train, self.y_val, self.y_val_mask, self.y_test,
-                                         self.data_type)
+                                         self.data_type, feature_dtype=self.feature_dtype,
+                                         search_mode=self.search_mode)
 
         early_stopping = MaskedEarlyStopping(patience=5, delta=0.001)
+        features_changed = True
         while True:
             XGBoost_Selector.create_masked_datasets()
             if self.data_type == "Classification":
@@ -119,55 +183,113 @@ class Feature_Selector_XGB:
             else:
                 self.criterion = XGBoost_Selector.mean_squared_error
 
-            # Train the model
-            XGBoost_Selector.Train_with_RandomSearch()
+            # Train the model. If the previous iteration removed no feature the data is unchanged, so the fitted model
+            # and its cached losses are reused and only the mask search runs again.
+            if features_changed or not self.reuse_unchanged_model:
+                if self.warm_start:
+                    XGBoost_Selector.Train_with_WarmStart(self.warm_start_tolerance)
+                else:
+                    XGBoost_Selector.Train_with_RandomSearch()
             self.model = XGBoost_Selector.searched_trained_model
             # xgb.plot_importance(self.model, importance_type='gain', figsize=(10, 10))
             # plt.show()
             # Get the validation loss
-            if self.data_type == "Classification":
-                y_hat_after_train = self.model.predict_proba(XGBoost_Selector.masked_X_val)
-            else:
-                y_hat_after_train = self.model.predict(XGBoost_Selector.masked_X_val)
-
-            loss_after_train = self.criterion(y_hat_after_train, XGBoost_Selector.masked_y_val)
+            val_scorer = MaskScorer(self.model, XGBoost_Selector.X_val, XGBoost_Selector.masked_y_val, self.data_type,
+                                    self.criterion, cache=self.prediction_cache, split="X_val")
+            y_hat_after_train, loss_after_train = val_scorer.evaluate(XGBoost_Selector.mask)
             # Update the training iteration
-            train_loss_cache.append(loss_after_train.item())
+            train_loss_cache.append(loss_after_train)
             # print('Training Iteration: {} \tLoss: {:.6f}'.format(training_iter, loss_after_train))
             # print("Training Iteration Complete")
             training_iter += 1
 
             # Get the validation loss
             XGBoost_Selector.create_masked_datasets()
-            if self.data_type == "Classification":
-                y_hat_before_mask_optim = self.model.predict_proba(XGBoost_Selector.masked_X_mask_val)
-            else:
-                y_hat_before_mask_optim = self.model.predict(XGBoost_Selector.masked_X_mask_val)
-
-            loss_before_mask_optim = self.criterion(y_hat_before_mask_optim, XGBoost_Selector.masked_y_mask_val)
-            mask_loss_cache.append(loss_before_mask_optim.item())
-            # print('Current Mask Loss: {:.6f}'.format(loss_before_mask_optim.item()))
-            random_idx_holder = []
+            mask_scorer = make_tree_mask_scorer(self.model, XGBoost_Selector.X_val_mask,
+                                                XGBoost_Selector.masked_y_mask_val, self.data_type, self.criterion,
+                                                XGBoost_Selector.mask,
+                                                incremental=self.incremental_trees, batch_size=self.mask_batch_size,
+                                                pool=pool, cache=self.prediction_cache,
+                                                racing_rows=self.racing_rows, racing_confidence=self.racing_confidence,
+                                                abort_rows=self.abort_rows)
+            y_hat_before_mask_optim, loss_before_mask_optim = mask_scorer.evaluate(XGBoost_Selector.mask)
+            mask_loss_cache.append(loss_before_mask_optim)
+            # print('Current Mask Loss: {:.6f}'.format(loss_before_mask_optim))
+            usage = None
+            if self.drop_unused_features or self.candidate_ordering in ("split", "gain"):
+                usage = FeatureUsageIndex.from_model(self.model, self.num_of_features)
+            candidate_scheduler = GroupCandidateScheduler if self.group_elimination else CandidateScheduler
+            # Importance-guided orderings try the features most likely to be accepted first, so the search stops
+            # once it has been through them instead of starting over
+            scheduler = candidate_scheduler(self.num_of_features,
+                                            self.candidate_scores(usage, XGBoost_Selector.X_val_mask),
+                                            random_state=candidate_random_state,
+                                            single_pass=self.candidate_ordering in ("importance", "gain", "contrib"))
+            if self.drop_unused_features:
+                # Features that no split uses cannot change the loss, so they are dropped without being scored
+                unused = usage.unused(XGBoost_Selector.mask)
+                if 0 < len(unused) < np.sum(XGBoost_Selector.mask):
+                    XGBoost_Selector.mask[unused] = 0
+                    mask_scorer.commit(XGBoost_Selector.mask)
+                    scheduler.discard(unused)
+            if self.contrib_screening:
+                # Features whose estimated loss change is well above the threshold are kept without an exact
+                # evaluation. Those well below it are dropped together if one exact evaluation accepts the drop;
+                # otherwise they are tried one at a time as usual.
+                screen = ContributionScreen(self.model, XGBoost_Selector.X_val_mask, XGBoost_Selector.masked_y_mask_val,
+                                            self.data_type)
+                loss_changes = screen.relative_loss_changes(XGBoost_Selector.mask, loss_before_mask_optim)
+                active = XGBoost_Selector.mask != 0
+                scheduler.discard(np.flatnonzero(active & (loss_changes > 0.02 * (1 + self.screening_margin))))
+                likely_dropped = np.flatnonzero(active & (loss_changes < 0.02 * (1 - self.screening_margin)))
+                if 0 < len(likely_dropped) < np.sum(XGBoost_Selector.mask):
+                    candidate_mask = XGBoost_Selector.mask.copy()
+                    candidate_mask[likely_dropped] = 0
+                    mask_loss_cache.append(mask_scorer.losses([candidate_mask])[0])
+                    if mask_loss_cache[-2] == 0:
+                        mask_loss_cache[-2] = 1e-5
+                    if (mask_loss_cache[-1] - mask_loss_cache[-2]) / mask_loss_cache[-2] > 0.02 or \
+                            (mask_loss_cache[-1] - mask_loss_cache[0]) / mask_loss_cache[0] > 0.02:
+                        mask_loss_cache.pop()
+                    else:
+                        XGBoost_Selector.mask[likely_dropped] = 0
+                        full_loss_cache.append(mask_loss_cache[-1])
+                        mask_cache.append(XGBoost_Selector.mask)
+                        mask_scorer.commit(XGBoost_Selector.mask)
+                        scheduler.discard(likely_dropped)
+            pending_idx = []
+            scored_candidates = []
             # Mask Optimization
             for mask_idx in range(self.num_of_features):
                 while mask_optim_patience < 5:
-                    random_idx = np.random.randint(0, self.num_of_features)
-                    while len(random_idx_holder) > 1 and random_idx_holder.__contains__(random_idx):
-                        random_idx = np.random.randint(0, self.num_of_features)
-                        if len(random_idx_holder) == len(XGBoost_Selector.mask):
+                    # Score a batch of candidate drops (single features, or blocks of features with
+                    # group_elimination) against the current mask. Candidates that were scored after an accepted drop
+                    # are stale and get rescored with the next batch.
+                    if not scored_candidates:
+                        while len(pending_idx) < mask_scorer.batch_size:
+                            candidate_idx = scheduler.draw()
+                            if candidate_idx is None:
+                                break
+                            pending_idx.append(candidate_idx)
+                        if not pending_idx:
+                            # The scheduler has no candidates left, or a single-pass scheduler has been through them
+                            mask_optim_patience = 5
                             break
-                    if not random_idx_holder.__contains__(random_idx):
-                        random_idx_holder.append(random_idx)
+                        candidate_masks = []
+                        for candidate_idx in pending_idx:
+                            candidate_mask = XGBoost_Selector.mask.copy()
+                            candidate_mask[candidate_idx] = 0
+                            candidate_masks.append(candidate_mask)
+                        # Losses above this bound are rejected by the rule below, which lets racing stop early
+                        rejection_bound = min(max(mask_loss_cache[-1], 1e-5), mask_loss_cache[0]) * (1 + 0.02)
+                        candidate_losses = mask_scorer.losses(candidate_masks, rejection_bound, XGBoost_Selector.mask)
+                        scored_candidates = list(zip(pending_idx, candidate_losses))
+                        pending_idx = []
+                    random_idx, current_mask_loss = scored_candidates.pop(0)
                     # Mask Optimization
                     XGBoost_Selector.mask[random_idx] = 0
-                    XGBoost_Selector.create_masked_datasets()
-                    if self.data_type == "Classification":
-                        y_hat_current_mask = self.model.predict_proba(XGBoost_Selector.masked_X_mask_val)
-                    else:
-                        y_hat_current_mask = self.model.predict(XGBoost_Selector.masked_X_mask_val)
-                    current_mask_loss = self.criterion(y_hat_current_mask, XGBoost_Selector.masked_y_mask_val)
-                    mask_loss_cache.append(current_mask_loss.item())
-                    # print(f'Mask Optimization Loss for mask {XGBoost_Selector.mask}: {current_mask_loss.item()}')
+                    mask_loss_cache.append(current_mask_loss)
+                    # print(f'Mask Optimization Loss for mask {XGBoost_Selector.mask}: {current_mask_loss}')
                     # Check if the mask loss is greater than the previous mask loss or if the mask loss is greater than
                     # the previous mask loss by a certain threshold
                     if mask_loss_cache[-2] == 0:
@@ -176,7 +298,8 @@ class Feature_Selector_XGB:
                             (mask_loss_cache[-1] - mask_loss_cache[0]) / mask_loss_cache[0] > 0.02:
                         XGBoost_Selector.mask[random_idx] = 1
                         mask_loss_cache.pop()
-                        mask_optim_patience += 1
+                        if scheduler.reject(random_idx):
+                            mask_optim_patience += 1
 
                     else:
                         if np.sum(XGBoost_Selector.mask) == 0:
@@ -187,9 +310,14 @@ class Feature_Selector_XGB:
                             stop_mask = 1
                             mask_idx = self.num_of_features
                             mask_optim_patience = 5
-                        full_loss = current_mask_loss.item()
+                        full_loss = current_mask_loss
                         full_loss_cache.append(full_loss)
                         mask_cache.append(XGBoost_Selector.mask)
+                        mask_scorer.commit(XGBoost_Selector.mask)
+                        scheduler.discard(random_idx)
+                        pending_idx = [candidate_idx for candidate_idx, _ in scored_candidates]
+                        scored_candidates = []
+            mask_scorer.close()
             # Get the best mask from the mask cache
             zero_columns = np.where(XGBoost_Selector.mask == 0)[0]
             # print(f'Final mask: {XGBoost_Selector.mask}')
@@ -204,40 +332,25 @@ class Feature_Selector_XGB:
             # fig = go.Figure(data=[trace], layout=layout)
             # fig.show()
 
-            # Evaluate the model
-            X_eval_set = np.concatenate([XGBoost_Selector.X_val, XGBoost_Selector.X_val_mask], axis=0)
-            y_full_eval = np.concatenate([XGBoost_Selector.y_val, XGBoost_Selector.y_val_mask], axis=0)
-            if self.data_type == "Classification":
-                y_hat = self.model.predict_proba(X_eval_set)
-                y_preds = self.model.predict(X_eval_set)
-                # Get the final loss
-                final_mask_loss = self.criterion(y_hat, y_full_eval)
-                final_loss_cache.append(final_mask_loss.item())
-
-                # print(f"Final Mask Loss:{final_mask_loss.item()}")
-                # print(classification_report(y_full_eval, y_preds, target_names=["0", "1"]))
-                # print(f"Accuracy {accuracy_score(y_full_eval, y_preds)}")
-            else:
-                y_hat = self.model.predict(X_eval_set)
-                # Get the final loss
-                final_mask_loss = self.criterion(y_hat, y_full_eval)
-                final_loss_cache.append(final_mask_loss.item())
-                # print(f"Final Mask Loss:{final_mask_loss.item()}")
+            # Evaluate the model. The mask was all ones when this model predicted the validation and mask-validation
+            # splits above, so the loss on both splits together is the size-weighted mean of their losses.
+            n_val, n_val_mask = len(XGBoost_Selector.y_val), len(XGBoost_Selector.y_val_mask)
+            final_mask_loss = np.float64((n_val * loss_after_train + n_val_mask * loss_before_mask_optim) /
+                                         (n_val + n_val_mask))
+            final_loss_cache.append(final_mask_loss.item())
+            # print(f"Final Mask Loss:{final_mask_loss.item()}")
 
             # Update the datasets
-            XGBoost_Selector.mask = np.delete(XGBoost_Selector.mask, zero_columns)
-            XGBoost_Selector.replicate_mask = np.delete(XGBoost_Selector.replicate_mask, zero_columns)
-            XGBoost_Selector.X_train = np.delete(XGBoost_Selector.X_train, zero_columns, axis=1)
-            XGBoost_Selector.X_val = np.delete(XGBoost_Selector.X_val, zero_columns, axis=1)
-            XGBoost_Selector.X_val_mask = np.delete(XGBoost_Selector.X_val_mask, zero_columns, axis=1)
-            XGBoost_Selector.X_test = np.delete(XGBoost_Selector.X_test, zero_columns, axis=1)
+            XGBoost_Selector.drop_features(zero_columns)
             # Update the number of features
             self.num_of_features -= len(zero_columns)
+            features_changed = len(zero_columns) > 0
             iter += 1
             # Early Stopping
             early_stopping(XGBoost_Selector.mask, final_mask_loss.item())
             if early_stopping.early_stop:
                 print("Optimization Process Have Stopped!!!")
+                print("Mask Cache Statistics for AFS-BM XGB: {}".format(self.prediction_cache.stats()))
                 print("Selected Features for AFS-BM XGB: {}".format(self.col_names[XGBoost_Selector.replicate_mask]))
                 print("Selected Features for AFS-BM XGB: {}".format(self.col_names[XGBoost_Selector.replicate_mask]))
                 # trace = go.Scatter(x=np.arange(full_loss_cache.__len__()),
@@ -252,7 +365,7 @@ class Feature_Selector_XGB:
     def Test_Network(self):
         if self.data_type == "Classification":
             y_preds = self.model.predict_proba(self.xgbM_Selector.X_test)
-            y_hat = self.model.predict(self.xgbM_Selector.X_test)
+            y_hat = self.model.classes_[np.argmax(y_preds, axis=1)]
             test_loss = self.criterion(y_preds, self.xgbM_Selector.y_test)
             print(f"Final Test Loss:{test_loss.item()}")
             print(classification_report(self.xgbM_Selector.y_test, y_hat, target_names=["0", "1"]))
@@ -280,70 +393,170 @@ class XGBoost_Model:
     """Wrapper for XGBoost model with utility functions."""
 
     def __init__(self, params, param_grid, X_train, X_val, X_val_mask, X_test, y_train, y_val, y_val_mask, y_test,
-                 data_type):
+                 data_type, feature_dtype=None, search_mode="random"):
         # Initialization with dataset and parameters
         self.params = params
         self.param_grid = param_grid
-        self.X_train = X_train
+        # The feature matrices are held once, column-major, and read through the X_* properties below
+        self.dataset = ColumnStore({"X_train": X_train, "X_val": X_val, "X_val_mask": X_val_mask, "X_test": X_test},
+                                   dtype=feature_dtype)
         self.y_train = y_train
-        self.X_val = X_val
         self.y_val = y_val
-        self.X_val_mask = X_val_mask
         self.y_val_mask = y_val_mask
-        self.X_test = X_test
         self.y_test = y_test
         self.data_type = data_type
+        self.search_mode = search_mode
 
-        self.mask = np.ones(self.X_train.shape[1])
+        # In the dtype of the features, so masked matrices keep it
+        self.mask = np.ones(self.dataset.n_columns, dtype=self.dataset.dtype)
+        self._masked_cache = {}
+        self.best_params = None
+        self.reference_loss = None
         self.replicate_mask = np.arange(self.X_train.shape[1])
 
         if data_type == "Classification":
-            self.base_model = xgb.XGBClassifier(**self.params, device="cuda", tree_method="gpu_hist")
+            self.base_model = xgb.XGBClassifier(**device_params(self.params))
             self.params["eval_metric"] = ["logloss"]
             self.params["objective"] = ["binary"]
 
         else:
-            self.base_model = xgb.XGBRegressor(**self.params, device="cuda", tree_method="gpu_hist")
+            self.base_model = xgb.XGBRegressor(**device_params(self.params))
             self.params["eval_metric"] = ["rmse"]
             self.params["objective"] = ["regression"]
 
     def create_masked_datasets(self):
-        """Create datasets using the current mask."""
-        self.masked_X_train = self.X_train * self.mask
-        self.masked_X_val = self.X_val * self.mask
-        self.masked_X_test = self.X_test * self.mask
-        self.masked_X_mask_val = self.X_val_mask * self.mask
+        """Create datasets using the current mask.
 
+        The masked feature matrices are computed lazily, per split, by the ``masked_X_*`` properties below, so only
+        the labels are bound here.
+        """
         self.masked_y_train = self.y_train
         self.masked_y_val = self.y_val
         self.masked_y_test = self.y_test
         self.masked_y_mask_val = self.y_val_mask
 
+    def drop_features(self, positions):
+        """Remove the features at the given positions of the current mask from the mask and the datasets."""
+        self.mask = np.delete(self.mask, positions)
+        self.replicate_mask = np.delete(self.replicate_mask, positions)
+        self.dataset.drop(positions)
+        # The masked matrices of the previous columns are not used again, so their memory is released now
+        self._masked_cache.clear()
+
+    @property
+    def X_train(self):
+        """Training features on the remaining columns."""
+        return self.dataset.split("X_train")
+
+    @property
+    def X_val(self):
+        """Validation features on the remaining columns."""
+        return self.dataset.split("X_val")
+
+    @property
+    def X_val_mask(self):
+        """Mask validation features on the remaining columns."""
+        return self.dataset.split("X_val_mask")
+
+    @property
+    def X_test(self):
+        """Test features on the remaining columns."""
+        return self.dataset.split("X_test")
+
+    def _masked_split(self, split):
+        """Return ``split`` multiplied by the mask, recomputing it only if the split or the mask has changed."""
+        X = getattr(self, split)
+        if self.mask.all():
+            # Nothing is masked, as when the model is trained at the start of an outer iteration
+            return X
+        mask_key = self.mask.tobytes()
+        cached = self._masked_cache.get(split)
+        if cached is None or cached[0] is not X or cached[1] != mask_key:
+            cached = (X, mask_key, X * self.mask)
+            self._masked_cache[split] = cached
+        return cached[2]
+
+    @property
+    def masked_X_train(self):
+        """Training features under the current mask."""
+        return self._masked_split("X_train")
+
+    @property
+    def masked_X_val(self):
+        """Validation features under the current mask."""
+        return self._masked_split("X_val")
+
+    @property
+    def masked_X_test(self):
+        """Test features under the current mask."""
+        return self._masked_split("X_test")
+
+    @property
+    def masked_X_mask_val(self):
+        """Mask validation features under the current mask."""
+        return self._masked_split("X_val_mask")
+
     def Train_with_RandomSearch(self):
-        """Train the model using random search for hyperparameter optimization."""
+        """Train the model using random search, successive halving or the native search, as search_mode selects."""
         self.create_masked_datasets()
 
-        random_search = RandomizedSearchCV(self.base_model, param_distributions=self.param_grid, n_iter=15, cv=5,
-                                           verbose=-1, n_jobs=-1)
-        random_search.fit(self.masked_X_train, self.masked_y_train, eval_set=[(self.masked_X_val, self.masked_y_val)],
-                          verbose=False)
+        random_search = make_search(self.base_model, self.param_grid, self.search_mode, n_iter=15)
+        search_cache.fit(random_search, self.masked_X_train, self.masked_y_train,
+                         eval_set=[(self.masked_X_val, self.masked_y_val)], verbose=False)
         self.best_params = random_search.best_params_
         self.searched_trained_model = random_search.best_estimator_
 
     def Train_with_GridSearch(self):
         """Train the model using grid search for hyperparameter optimization."""
-        grid_search = GridSearchCV(self.base_model, param_grid=self.param_grid, cv=5, verbose=-1, n_jobs=-1)
-        grid_search.fit(self.masked_X_train, self.masked_y_train, eval_set=[(self.masked_X_val, self.masked_y_val)],
-                        verbose=False)
+        grid_search = make_grid_search(self.base_model, self.param_grid)
+        search_cache.fit(grid_search, self.masked_X_train, self.masked_y_train,
+                         eval_set=[(self.masked_X_val, self.masked_y_val)], verbose=False)
         self.best_params = grid_search.best_params_
         self.searched_trained_model = grid_search.best_estimator_
 
+    def Train_with_WarmStart(self, tolerance=0.01):
+        """Refit the previous best configuration on the current features, searching again only if it degrades.
+
+        The first call runs a full random search. Later calls fit the best parameters found so far once, and fall back
+        to a full random search when the loss on the mask validation split is more than ``tolerance`` (relative) above
+        the loss of the last searched model.
+
+        Every refit starts from scratch. A booster cannot be continued after a feature drop, since its trees split
+        on column positions of the previous features, and fit_network keeps the fitted model when no feature was
+        dropped, so the previous booster is not reused.
+        """
+        if self.best_params is None:
+            self.Train_with_RandomSearch()
+            self.reference_loss = self.validation_loss()
+            return
+
+        self.create_masked_datasets()
+        model = clone(self.base_model).set_params(**self.best_params)
+        model.fit(self.masked_X_train, self.masked_y_train, eval_set=[(self.masked_X_val, self.masked_y_val)],
+                  verbose=False)
+        loss = self.validation_loss(model)
+        if (loss - self.reference_loss) / max(self.reference_loss, 1e-5) > tolerance:
+            self.Train_with_RandomSearch()
+            self.reference_loss = self.validation_loss()
+        else:
+            self.searched_trained_model = model
+
+    def validation_loss(self, model=None):
+        """Compute the loss of a model (the searched model by default) on the masked mask validation split.
+
+        The mask validation split is held out of every fit, searches and early stopping included.
+        """
+        model = self.searched_trained_model if model is None else model
+        if self.data_type == "Classification":
+            return float(self.cross_entropy(model.predict_proba(self.masked_X_mask_val), self.masked_y_mask_val))
+        return float(self.mean_squared_error(model.predict(self.masked_X_mask_val), self.masked_y_mask_val))
+
     @staticmethod
     def cross_entropy(preds, labels):
         """Compute cross entropy loss."""
-        return log_loss(labels, preds)
+        return fast_log_loss(labels, preds)
 
     @staticmethod
     def mean_squared_error(preds, labels):
         """Compute mean squared error."""
-        return mean_squared_error(labels, preds)
+        return fast_mean_squared_error(labels, preds)
@@ -0,0 +1,165 @@
+import hashlib
+import os
+import sys
+
+import joblib
+import lightgbm as lgb
+import numpy as np
+import sklearn
+import xgboost as xgb
+from sklearn.base import BaseEstimator
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import GridSearchCV, HalvingRandomSearchCV, RandomizedSearchCV
+
+from Models.LightGBM_Engine import BinnedLightGBMSearchCV
+from Models.Resource_Manager import ThreadBudget, shared_arrays, thread_budget
+from Models.XGBoost_Engine import NativeXGBoostSearchCV
+
+SEARCH_MODES = ("random", "halving", "binned", "native")
+# Searches that train every configuration in this process through the native LightGBM or XGBoost API
+NATIVE_SEARCHES = (BinnedLightGBMSearchCV, NativeXGBoostSearchCV)
+# Parameters that only change how fast a model is fitted, left out of search fingerprints
+RUNTIME_PARAMS = ("n_jobs", "nthread", "num_threads", "pre_dispatch", "verbose", "verbosity")
+
+
+def make_search(estimator, param_distributions, search_mode="random", n_iter=100, cv=5, n_jobs=-1, factor=3):
+    """Return the hyperparameter search the selectors fit for search_mode.
+
+    "random" is a RandomizedSearchCV over n_iter configurations, each fitted with the full budget. XGBoost
+    estimators get the same random search from NativeXGBoostSearchCV, which draws and scores the same configurations
+    but builds the quantized training data of every fold once instead of once per fit. "halving" is a
+    HalvingRandomSearchCV that starts the same number of configurations on a small budget and keeps the best
+    1/factor of them, with factor times the budget, until the last round uses the full one. The budget is the number
+    of trees when the estimator has an n_estimators that is not searched, and the number of training rows otherwise.
+    "binned", for LightGBM estimators only, is the random search of BinnedLightGBMSearchCV, which bins the training
+    data once for all configurations and folds. "native" is the random search of the estimator's native-API engine:
+    BinnedLightGBMSearchCV for LightGBM and NativeXGBoostSearchCV for XGBoost. All expose best_params_ and
+    best_estimator_.
+    """
+    if search_mode in ("random", "native") and isinstance(estimator, xgb.XGBModel):
+        return NativeXGBoostSearchCV(estimator, param_distributions=param_distributions, n_iter=n_iter, cv=cv,
+                                     n_jobs=n_jobs)
+    if search_mode == "random":
+        return RandomizedSearchCV(estimator, param_distributions=param_distributions, n_iter=n_iter, cv=cv,
+                                  verbose=0, n_jobs=n_jobs)
+    if search_mode == "halving":
+        estimator_params = estimator.get_params()
+        if "n_estimators" in estimator_params and "n_estimators" not in param_distributions:
+            # XGBoost leaves n_estimators as None for its default of 100 trees
+            resource, max_resources = "n_estimators", estimator_params["n_estimators"] or 100
+        else:
+            resource, max_resources = "n_samples", "auto"
+        return HalvingRandomSearchCV(estimator, param_distributions=param_distributions, n_candidates=n_iter,
+                                     factor=factor, resource=resource, max_resources=max_resources,
+                                     min_resources="exhaust", cv=cv, verbose=0, n_jobs=n_jobs)
+    if search_mode in ("binned", "native") and isinstance(estimator, lgb.LGBMModel):
+        return BinnedLightGBMSearchCV(estimator, param_distributions=param_distributions, n_iter=n_iter, cv=cv,
+                                      n_jobs=n_jobs)
+    if search_mode in ("binned", "native"):
+        raise ValueError(f"search_mode {search_mode!r} is not available for {type(estimator).__name__}")
+    raise ValueError(f"Unknown search_mode {search_mode!r}, expected one of {SEARCH_MODES}")
+
+
+def make_grid_search(estimator, param_grid, cv=5, n_jobs=-1):
+    """Return a search over every configuration of param_grid: GridSearchCV, or NativeXGBoostSearchCV for XGBoost."""
+    if isinstance(estimator, xgb.XGBModel):
+        return NativeXGBoostSearchCV(estimator, param_distributions=param_grid, n_iter=None, cv=cv, n_jobs=n_jobs)
+    return GridSearchCV(estimator, param_grid=param_grid, cv=cv, verbose=0, n_jobs=n_jobs)
+
+
+def _update_digest(digest, value, depth=0):
+    """Feed value into digest, hashing arrays by content and other objects by type and simple attributes."""
+    if hasattr(value, "to_numpy") and not isinstance(value, np.ndarray):
+        value = value.to_numpy()
+    if isinstance(value, np.ndarray):
+        value = np.ascontiguousarray(value)
+        digest.update(f"ndarray{value.dtype.str}{value.shape}".encode())
+        digest.update(value.data if value.dtype != object else repr(value.tolist()).encode())
+    elif isinstance(value, dict):
+        digest.update(b"dict")
+        for key in sorted(value, key=repr):
+            digest.update(repr(key).encode())
+            _update_digest(digest, value[key], depth)
+    elif isinstance(value, (list, tuple)):
+        digest.update(type(value).__name__.encode())
+        for item in value:
+            _update_digest(digest, item, depth)
+    elif value is None or isinstance(value, (bool, int, float, str, bytes, np.generic)):
+        digest.update(repr(value).encode())
+    else:
+        # Estimators, callbacks and distributions: their type and, a few levels deep, their configuration
+        digest.update(f"{type(value).__module__}.{type(value).__qualname__}".encode())
+        if depth < 3:
+            if isinstance(value, BaseEstimator):
+                params = {key: param for key, param in value.get_params(deep=False).items()
+                          if key not in RUNTIME_PARAMS}
+                _update_digest(digest, params, depth + 1)
+            else:
+                _update_digest(digest, getattr(value, "__dict__", {}), depth + 1)
+
+
+class SearchCache:
+    """On-disk cache of fitted hyperparameter searches.
+
+    Entries are keyed by a fingerprint of the training data and fit parameters (eval sets included), the searched
+    parameters, the estimator and search settings (random_state included, thread counts excluded) and the library
+    versions, and store best_params_, best_score_ and the fitted best_estimator_. With directory None every search is
+    fitted.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def fingerprint(search, X, y, fit_params):
+        digest = hashlib.blake2b(digest_size=20)
+        estimator_package = type(search.estimator).__module__.split(".")[0]
+        versions = (sklearn.__version__, getattr(sys.modules.get(estimator_package), "__version__", None))
+        _update_digest(digest, [versions, search, X, y, fit_params])
+        return digest.hexdigest()
+
+    def fit(self, search, X, y=None, **fit_params):
+        """Fit search on X and y within the thread budget, or restore its results from the cache; return search."""
+        path = None
+        if self.directory is not None:
+            path = os.path.join(self.directory, self.fingerprint(search, X, y, fit_params) + ".joblib")
+            entry = None
+            if os.path.exists(path):
+                try:
+                    entry = joblib.load(path)
+                except Exception:
+                    entry = None
+            if entry is not None:
+                self.hits += 1
+                search.best_params_ = entry["best_params"]
+                search.best_score_ = entry["best_score"]
+                search.best_estimator_ = entry["best_estimator"]
+                ThreadBudget.set_threads(search.best_estimator_, thread_budget.n_cores)
+                return search
+            self.misses += 1
+        with thread_budget.search(search):
+            # Native searches train in this process, with all the threads of the search jobs
+            if thread_budget.parallel_fits > 1 and not isinstance(search, NATIVE_SEARCHES):
+                # Workers map the data from shared memory instead of receiving a pickled copy for every search. The
+                # shared copies live as long as X, y and fit_params, which stay referenced here until the fit is done.
+                search.fit(*shared_arrays.share((X, y)), **shared_arrays.share(fit_params))
+            else:
+                search.fit(X, y, **fit_params)
+        if path is not None:
+            os.makedirs(self.directory, exist_ok=True)
+            # Write to a temporary file first so that a concurrent run never reads a partial entry
+            temporary_path = f"{path}.{os.getpid()}.tmp"
+            joblib.dump({"best_params": search.best_params_, "best_score": search.best_score_,
+                         "best_estimator": search.best_estimator_}, temporary_path)
+            os.replace(temporary_path, path)
+        return search
+
+    def stats(self):
+        """Return the hit and miss counters."""
+        return {"hits": self.hits, "misses": self.misses}
+
+
+# Used by every hyperparameter search in Models/. Disabled until a directory is set, as the runners do.
+search_cache = SearchCache()
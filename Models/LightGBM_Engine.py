@@ -0,0 +1,201 @@
+import hashlib
+import os
+from collections import OrderedDict
+
+import lightgbm as lgb
+import numpy as np
+from sklearn.base import BaseEstimator, clone, is_classifier
+from sklearn.metrics import accuracy_score, r2_score
+from sklearn.model_selection import KFold, ParameterSampler, StratifiedKFold
+
+# LightGBM parameters, under their scikit-learn or native names, that change how a Dataset is binned. Datasets are
+# cached per value of these; the other parameters can change between trials on the same Dataset.
+DATASET_PARAMS = ("max_bin", "max_bin_by_feature", "min_data_in_bin", "subsample_for_bin", "bin_construct_sample_cnt",
+                  "use_missing", "zero_as_missing", "linear_tree", "seed", "data_random_seed")
+
+
+def booster_params(estimator, n_classes=None):
+    """Translate the parameters of an LGBMClassifier/LGBMRegressor into lgb.train parameters and boosting rounds."""
+    params = {key: value for key, value in estimator.get_params().items() if value is not None}
+    if params.pop("class_weight", None) is not None:
+        raise NotImplementedError("class_weight is not supported by the binned LightGBM search")
+    params.pop("importance_type", None)
+    num_boost_round = params.pop("n_estimators", 100)
+    params["num_threads"] = params.pop("n_jobs", -1)
+    if "random_state" in params:
+        params["seed"] = params.pop("random_state")
+    if "objective" not in params:
+        if not is_classifier(estimator):
+            params["objective"] = "regression"
+        elif n_classes > 2:
+            params["objective"] = "multiclass"
+        else:
+            params["objective"] = "binary"
+    if params["objective"] in ("multiclass", "softmax", "multiclassova"):
+        params["num_class"] = n_classes
+    # Parameters that only act at Dataset construction, such as min_data_in_leaf for pre-filtering, may then change
+    params["feature_pre_filter"] = False
+    return params, num_boost_round
+
+
+def _array_digest(*arrays):
+    digest = hashlib.blake2b(digest_size=20)
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(f"{array.dtype.str}{array.shape}".encode())
+        digest.update(array.data)
+    return digest.hexdigest()
+
+
+class DatasetCache:
+    """Constructed lgb.Dataset objects, binned once per training split and binning parameters.
+
+    Fold and trial datasets are row subsets of the cached one, which share its bins. Validation sets are binned with
+    the training split's bins. With a directory, training datasets are also saved with save_binary and loaded from
+    there by later runs.
+    """
+
+    def __init__(self, directory=None, max_entries=4):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.builds = 0
+        self.loads = 0
+        self.hits = 0
+
+    def _remember(self, key, dataset):
+        self.entries[key] = dataset
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return dataset
+
+    def dataset(self, X, y, params, digest=None):
+        """Return the constructed training Dataset of X and y for the binning parameters in params.
+
+        digest is _array_digest(X, y); callers that look up the same arrays repeatedly compute it once and pass it.
+        """
+        dataset_params = {key: params[key] for key in DATASET_PARAMS if key in params}
+        dataset_params.update(feature_pre_filter=False, verbosity=-1)
+        key = (digest or _array_digest(X, y)) + repr(sorted(dataset_params.items()))
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        path = None
+        if self.directory is not None:
+            name = hashlib.blake2b(f"{key}{lgb.__version__}".encode(), digest_size=20).hexdigest()
+            path = os.path.join(self.directory, name + ".bin")
+            if os.path.exists(path):
+                self.loads += 1
+                return self._remember(key, lgb.Dataset(path, params=dataset_params, free_raw_data=False).construct())
+        self.builds += 1
+        dataset = lgb.Dataset(X, y, params=dataset_params, free_raw_data=False).construct()
+        if path is not None:
+            os.makedirs(self.directory, exist_ok=True)
+            # Write to a temporary file first so that a concurrent run never reads a partial file
+            temporary_path = f"{path}.{os.getpid()}.tmp"
+            dataset.save_binary(temporary_path)
+            os.replace(temporary_path, path)
+        return self._remember(key, dataset)
+
+    def validation_dataset(self, reference, X, y, digest=None):
+        """Return X and y binned with the bins of the training Dataset reference; digest is as for dataset()."""
+        key = (id(reference), digest or _array_digest(X, y))
+        # Entries keep their reference, whose id could otherwise be reused by a later training Dataset
+        if key in self.entries and self.entries[key][0] is reference:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key][1]
+        dataset = lgb.Dataset(X, y, reference=reference, free_raw_data=False).construct()
+        return self._remember(key, (reference, dataset))[1]
+
+    def stats(self):
+        """Return how many datasets were binned, loaded from disk and reused."""
+        return {"builds": self.builds, "loads": self.loads, "hits": self.hits, "size": len(self.entries)}
+
+
+# Used by every BinnedLightGBMSearchCV unless it is given its own cache; the runners set its directory
+dataset_cache = DatasetCache()
+
+
+class BinnedLightGBMSearchCV(BaseEstimator):
+    """Random search over LightGBM parameters that bins the training data once for all trials and folds.
+
+    Configurations are sampled and scored like RandomizedSearchCV (the estimator's default score, accuracy or R^2,
+    averaged over cv stratified or plain folds), but every trial trains with lgb.train on row subsets of one cached
+    Dataset instead of re-binning its rows. Trials run one at a time, each with the threads of all n_jobs search jobs.
+    Exposes best_params_, best_score_, best_estimator_ and cv_results_ like the scikit-learn searches.
+    """
+
+    def __init__(self, estimator, param_distributions, n_iter=100, cv=5, n_jobs=None, random_state=None,
+                 cache=None):
+        self.estimator = estimator
+        self.param_distributions = param_distributions
+        self.n_iter = n_iter
+        self.cv = cv
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.cache = cache
+
+    def fit(self, X, y, eval_set=None, callbacks=None, **fit_params):
+        cache = dataset_cache if self.cache is None else self.cache
+        X_fit, y_fit, eval_set_fit = X, y, eval_set
+        X = np.asarray(X)
+        classifier = is_classifier(self.estimator)
+        if classifier:
+            classes, labels = np.unique(np.asarray(y).ravel(), return_inverse=True)
+        else:
+            classes, labels = None, np.asarray(y).ravel()
+        if eval_set is not None and not isinstance(eval_set, list):
+            eval_set = [eval_set]
+        if eval_set is not None:
+            eval_set = [(np.asarray(X_eval), np.asarray(y_eval).ravel()) for X_eval, y_eval in eval_set]
+            if classifier:
+                eval_set = [(X_eval, np.searchsorted(classes, y_eval)) for X_eval, y_eval in eval_set]
+        splitter = StratifiedKFold(self.cv) if classifier else KFold(self.cv)
+        folds = list(splitter.split(X, labels))
+        # The arrays are hashed once per search rather than on every cache lookup
+        digest = _array_digest(X, labels)
+        eval_digests = [_array_digest(X_eval, y_eval) for X_eval, y_eval in eval_set or []]
+        estimator_threads = self.estimator.get_params().get("n_jobs") or -1
+        threads = estimator_threads * self.n_jobs if estimator_threads > 0 and (self.n_jobs or 0) > 0 else -1
+
+        candidates = list(ParameterSampler(self.param_distributions, self.n_iter, random_state=self.random_state))
+        fold_datasets = {}
+        mean_scores = []
+        for candidate in candidates:
+            params, num_boost_round = booster_params(clone(self.estimator).set_params(**candidate),
+                                                     len(classes) if classifier else None)
+            params["num_threads"] = threads
+            params.setdefault("verbosity", -1)
+            full = cache.dataset(X, labels, params, digest)
+            valid_sets = None
+            if eval_set is not None:
+                valid_sets = [cache.validation_dataset(full, X_eval, y_eval, eval_digest)
+                              for (X_eval, y_eval), eval_digest in zip(eval_set, eval_digests)]
+            scores = []
+            for fold, (train_idx, test_idx) in enumerate(folds):
+                if (id(full), fold) not in fold_datasets:
+                    fold_datasets[id(full), fold] = full.subset(train_idx).construct()
+                booster = lgb.train(params, fold_datasets[id(full), fold], num_boost_round=num_boost_round,
+                                    valid_sets=valid_sets, callbacks=callbacks)
+                preds = booster.predict(X[test_idx], num_iteration=booster.best_iteration or None)
+                if not classifier:
+                    scores.append(r2_score(labels[test_idx], preds))
+                elif preds.ndim == 1:
+                    scores.append(accuracy_score(labels[test_idx], preds > 0.5))
+                else:
+                    scores.append(accuracy_score(labels[test_idx], np.argmax(preds, axis=1)))
+            mean_scores.append(float(np.mean(scores)))
+
+        best = int(np.argmax(mean_scores))
+        self.cv_results_ = {"params": candidates, "mean_test_score": np.array(mean_scores)}
+        self.best_index_ = best
+        self.best_params_ = candidates[best]
+        self.best_score_ = mean_scores[best]
+        # The refit goes through the scikit-learn wrapper, on the data as given, so that callers get the usual fitted
+        # estimator
+        self.best_estimator_ = clone(self.estimator).set_params(**self.best_params_)
+        self.best_estimator_.fit(X_fit, y_fit, eval_set=eval_set_fit, callbacks=callbacks, **fit_params)
+        return self
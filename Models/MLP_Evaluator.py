@@ -0,0 +1,137 @@
+import warnings
+
+import numpy as np
+from scipy.special import expit
+
+from Models.Mask_Search import MaskScorer, batch_losses, predict_split
+
+
+def _inplace_identity(Z):
+    pass
+
+
+def _inplace_logistic(Z):
+    expit(Z, out=Z)
+
+
+def _inplace_tanh(Z):
+    np.tanh(Z, out=Z)
+
+
+def _inplace_relu(Z):
+    np.maximum(Z, 0, out=Z)
+
+
+def _inplace_softmax(Z):
+    Z -= Z.max(axis=-1, keepdims=True)
+    np.exp(Z, out=Z)
+    Z /= Z.sum(axis=-1, keepdims=True)
+
+
+# Same activations as sklearn.neural_network, applied in place to arrays of any shape
+ACTIVATIONS = {"identity": _inplace_identity, "logistic": _inplace_logistic, "tanh": _inplace_tanh,
+               "relu": _inplace_relu, "softmax": _inplace_softmax}
+
+
+class RankOneMLPScorer(MaskScorer):
+    """MaskScorer for scikit-learn MLPClassifier/MLPRegressor models that keeps the first-layer pre-activations.
+
+    Zeroing input j only subtracts x_j * W1[j] from the first-layer pre-activations of the current mask, so a
+    candidate is applied as a rank-1 update and only the remaining layers are propagated, for all candidates of a
+    batch at once. commit() moves the cached pre-activations to the mask the search accepted.
+    """
+
+    def __init__(self, model, X, y, data_type, criterion, mask, **kwargs):
+        # Rank-1 scoring runs in-process; a worker pool would have to rebuild the cached pre-activations
+        kwargs["n_jobs"] = 1
+        super().__init__(model, X, y, data_type, criterion, **kwargs)
+        if model.out_activation_ == "logistic" and len(getattr(model, "classes_", ())) != 2:
+            raise NotImplementedError("Multilabel MLP models are not supported")
+        self.coefs = model.coefs_
+        self.intercepts = model.intercepts_
+        self.X_array = np.asarray(X, dtype=self.coefs[0].dtype)
+        self.base_mask = np.array(mask, dtype=self.X_array.dtype)
+        self.first_layer = (self.X_array * self.base_mask) @ self.coefs[0] + self.intercepts[0]
+
+    def first_layer_for(self, mask, out=None):
+        """Return the first-layer pre-activations under mask, updated from the cached ones.
+
+        The result is written to out when it is given, otherwise a new array is returned.
+        """
+        if out is None:
+            out = np.empty_like(self.first_layer)
+        out[...] = self.first_layer
+        delta = np.asarray(mask, dtype=self.X_array.dtype) - self.base_mask
+        changed = np.flatnonzero(delta)
+        if len(changed):
+            out += (self.X_array[:, changed] * delta[changed]) @ self.coefs[0][changed]
+        return out
+
+    def propagate(self, activation):
+        """Propagate first-layer pre-activations, shape (..., n_hidden), through the remaining layers.
+
+        activation is overwritten.
+        """
+        for coef, intercept in zip(self.coefs[1:], self.intercepts[1:]):
+            ACTIVATIONS[self.model.activation](activation)
+            activation = activation @ coef
+            activation += intercept
+        ACTIVATIONS[self.model.out_activation_](activation)
+        if self.data_type == "Classification":
+            if self.model.out_activation_ == "logistic":
+                return np.concatenate([1 - activation, activation], axis=-1)
+            return activation
+        if activation.shape[-1] == 1:
+            return activation[..., 0]
+        return activation
+
+    def predict_mask(self, mask):
+        return self.propagate(self.first_layer_for(mask))
+
+    def predict_rows(self, mask, rows):
+        first_layer = self.first_layer[rows]
+        delta = np.asarray(mask, dtype=self.X_array.dtype) - self.base_mask
+        changed = np.flatnonzero(delta)
+        if len(changed):
+            first_layer += (self.X_array[np.ix_(rows, changed)] * delta[changed]) @ self.coefs[0][changed]
+        return self.propagate(first_layer)
+
+    def compute_losses(self, masks):
+        n_samples = self.X_array.shape[0]
+        chunk = max(1, self.max_batch_rows // max(n_samples, 1))
+        losses = []
+        all_preds = []
+        for start in range(0, len(masks), chunk):
+            chunk_masks = masks[start:start + chunk]
+            stacked = np.empty((len(chunk_masks),) + self.first_layer.shape, dtype=self.first_layer.dtype)
+            for i, mask in enumerate(chunk_masks):
+                self.first_layer_for(mask, out=stacked[i])
+            preds = self.propagate(stacked)
+            if self.batch_size == 1:
+                losses.extend(float(self.criterion(candidate_preds, self.y)) for candidate_preds in preds)
+            else:
+                losses.extend(batch_losses(preds, self.y, self.data_type, self.classes).tolist())
+            all_preds.extend(np.array(candidate_preds) for candidate_preds in preds)
+        return losses, all_preds
+
+    def commit(self, mask):
+        self.first_layer = self.first_layer_for(mask)
+        self.base_mask = np.array(mask, dtype=self.X_array.dtype)
+
+
+def make_mlp_mask_scorer(model, X, y, data_type, criterion, mask, rank_one=False, **kwargs):
+    """Return a RankOneMLPScorer when requested and the model is supported, otherwise a MaskScorer.
+
+    The rank-1 scorer is checked against the model's own predictions on the current mask before it is used.
+    """
+    if rank_one:
+        try:
+            scorer = RankOneMLPScorer(model, X, y, data_type, criterion, mask, **kwargs)
+        except NotImplementedError as error:
+            warnings.warn(f"Rank-1 MLP scoring disabled: {error}")
+        else:
+            expected = np.asarray(predict_split(model, X * mask, data_type))
+            if np.allclose(scorer.predict_mask(mask), expected, rtol=1e-5, atol=1e-7):
+                return scorer
+            warnings.warn("Rank-1 MLP scoring disabled: cached pre-activations do not match the model")
+    return MaskScorer(model, X, y, data_type, criterion, **kwargs)
@@ -0,0 +1,568 @@
+import itertools
+import multiprocessing
+import os
+import shutil
+import tempfile
+import weakref
+from statistics import NormalDist
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import joblib
+import numpy as np
+from sklearn.utils import check_random_state
+from threadpoolctl import threadpool_limits
+
+from Models.Loss_Kernels import sample_log_loss, sample_squared_error
+from Models.Resource_Manager import ThreadBudget, thread_budget
+
+
+def native_predict(model, X):
+    """Predict X with the booster of a fitted LightGBM or XGBoost model, or return None for other models.
+
+    The values are those of predict_proba (positive class only for binary classification) and predict, without the
+    input checks of the scikit-learn wrappers. XGBoost predicts with inplace_predict, without building a DMatrix.
+    """
+    # Unfitted LightGBM models raise an AttributeError for booster_
+    if hasattr(model, "booster_") and not callable(model.objective_):
+        return model.booster_.predict(X)
+    if hasattr(model, "get_booster") and model.__sklearn_is_fitted__() and not callable(model.objective):
+        iteration_range = (0, model.best_iteration + 1) if hasattr(model, "best_iteration") else (0, 0)
+        return model.get_booster().inplace_predict(X, iteration_range=iteration_range)
+    return None
+
+
+def predict_split(model, X, data_type):
+    """Predict probabilities for classification and values for regression."""
+    preds = native_predict(model, X)
+    if preds is None:
+        return model.predict_proba(X) if data_type == "Classification" else model.predict(X)
+    if data_type == "Classification" and preds.ndim == 1:
+        return np.vstack((1.0 - preds, preds)).T
+    return preds
+
+
+def sample_losses(preds, labels, data_type, classes=None):
+    """Compute the log loss or squared error of every sample.
+
+    preds has shape (..., n_samples) for regression and (..., n_samples, n_classes) for classification, where the
+    last axis follows ``classes``; the result has shape (..., n_samples).
+    """
+    if data_type == "Classification":
+        return sample_log_loss(labels, preds, classes)
+    return sample_squared_error(labels, preds)
+
+
+def batch_losses(preds, labels, data_type, classes=None):
+    """Compute one loss per candidate from predictions stacked along the first axis.
+
+    preds has shape (n_candidates, n_samples) for regression and (n_candidates, n_samples, n_classes) for
+    classification, where the last axis follows ``classes``.
+    """
+    return sample_losses(preds, labels, data_type, classes).mean(axis=1)
+
+
+_model_ids = weakref.WeakKeyDictionary()
+_next_model_id = itertools.count()
+
+
+def model_id(model):
+    """Return an id that is unique to a trained model object for the lifetime of the process.
+
+    Unlike id(), the value is never reused after the model is garbage collected, and copies of a model get their
+    own id.
+    """
+    if model not in _model_ids:
+        _model_ids[model] = next(_next_model_id)
+    return _model_ids[model]
+
+
+def _nbytes(preds):
+    return 0 if preds is None else np.asarray(preds).nbytes
+
+
+class MaskPredictionCache:
+    """LRU cache of losses, and of the predictions of evaluated masks, keyed by (model id, mask bitset, split).
+
+    Candidates scored by MaskScorer.losses() are stored with their loss only; predictions are kept for the masks
+    that MaskScorer.evaluate() returns them for. Entries are evicted once there are more than maxsize of them or
+    their predictions take more than max_nbytes.
+    """
+
+    def __init__(self, maxsize=512, max_nbytes=1 << 28):
+        self.maxsize = maxsize
+        self.max_nbytes = max_nbytes
+        self.nbytes = 0
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model, mask, split):
+        mask = np.asarray(mask)
+        return model_id(model), len(mask), np.packbits(mask != 0).tobytes(), split
+
+    def get(self, model, mask, split, with_preds=False):
+        """Return the cached (predictions, loss) pair, or None on a miss.
+
+        With with_preds=True, an entry that only holds a loss is a miss, since the caller has to predict anyway.
+        """
+        key = self.key(model, mask, split)
+        entry = self.entries.get(key)
+        if entry is None or (with_preds and entry[0] is None):
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, model, mask, split, preds, loss):
+        key = self.key(model, mask, split)
+        if key in self.entries:
+            self.nbytes -= _nbytes(self.entries[key][0])
+        self.entries[key] = (preds, loss)
+        self.entries.move_to_end(key)
+        self.nbytes += _nbytes(preds)
+        while self.entries and (len(self.entries) > self.maxsize or self.nbytes > self.max_nbytes):
+            evicted_preds, _ = self.entries.popitem(last=False)[1]
+            self.nbytes -= _nbytes(evicted_preds)
+
+    def stats(self):
+        """Return the hit and miss counters."""
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.entries), "nbytes": self.nbytes,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+
+# Shared by the LightGBM, XGBoost and MLP selectors unless they are given their own cache
+mask_prediction_cache = MaskPredictionCache()
+
+
+class MaskScorer:
+    """Scores candidate masks of a trained model on one split.
+
+    With batch_size=1 every mask is scored with its own predict call and the selector's criterion. With a larger
+    batch size the masked copies of the split are stacked and predicted in as few calls as max_batch_rows allows,
+    and all candidate losses are computed in one vectorized pass.
+
+    With a MaskScoringPool (pool), or n_jobs > 1 for a pool of the scorer's own, the batches are split across its
+    worker processes. The model and the split are published to the pool once per scorer, and only the candidate masks
+    travel per batch. Results come back in submission order, so the losses do not depend on worker scheduling.
+
+    When a cache is given, masks that were already scored for this model and split are served from it.
+
+    With racing_rows > 0, losses() races each candidate against a rejection bound: the candidate is first scored on
+    a stratified subsample of racing_rows rows, and the subsample doubles until either a one-sided confidence bound
+    on the loss difference to the current mask lies above the bound, or the whole split is scored. Only rejections
+    stop early; a candidate that may be accepted always ends with its exact loss. Racing scores in-process.
+
+    With abort_rows > 0 and no racing, a candidate scored against a bound is predicted abort_rows rows at a time in
+    split order. Sample losses are non-negative, so once their running sum over the whole split's size exceeds the
+    bound the candidate is certain to be rejected and its remaining rows are skipped.
+    """
+
+    def __init__(self, model, X, y, data_type, criterion, batch_size=1, max_batch_rows=250000, n_jobs=1,
+                 cache=None, split="X_val_mask", racing_rows=0, racing_confidence=0.99, abort_rows=0, pool=None):
+        self.model = model
+        self.X = X
+        self.y = y
+        self.data_type = data_type
+        self.criterion = criterion
+        # A pool of the scorer's own is shut down by close(); a pool that is passed in belongs to the caller
+        self.owns_pool = pool is None and n_jobs > 1
+        self.pool = MaskScoringPool(n_jobs) if self.owns_pool else pool
+        self.pool_state = None
+        self.n_jobs = 1 if self.pool is None else self.pool.n_jobs
+        self.batch_size = max(batch_size, self.n_jobs)
+        self.max_batch_rows = max_batch_rows
+        self.classes = getattr(model, "classes_", None)
+        self.cache = cache
+        self.split = split
+        self.racing_rows = racing_rows
+        self.racing_z = NormalDist().inv_cdf(racing_confidence)
+        self.racing_order = None
+        self.abort_rows = abort_rows
+        self.reference_key = None
+        self.reference_losses = None
+        self.reference_loss = None
+
+    def evaluate(self, mask):
+        """Return the predictions and the loss of the model on the split under a single mask."""
+        if self.cache is not None:
+            entry = self.cache.get(self.model, mask, self.split, with_preds=True)
+            if entry is not None:
+                return entry
+        preds = self.predict_mask(mask)
+        loss = float(self.criterion(preds, self.y))
+        if self.cache is not None:
+            self.cache.put(self.model, mask, self.split, preds, loss)
+        return preds, loss
+
+    def losses(self, masks, bound=None, reference=None):
+        """Return the loss of the model on the split under each of the given masks.
+
+        When racing is enabled and a bound and the current (reference) mask are given, candidates that are clearly
+        above the bound are rejected early; their loss is an estimate above the bound and is not cached.
+        """
+        losses = [None] * len(masks)
+        missing = list(range(len(masks)))
+        if self.cache is not None:
+            missing = []
+            for i, mask in enumerate(masks):
+                entry = self.cache.get(self.model, mask, self.split)
+                if entry is None:
+                    missing.append(i)
+                else:
+                    losses[i] = entry[1]
+            if not missing:
+                return losses
+
+        missing_masks = [masks[i] for i in missing]
+        racing = self.racing_rows and bound is not None and reference is not None
+        if racing or (self.abort_rows and bound is not None):
+            new_losses, exact = [], []
+            for mask in missing_masks:
+                loss, preds = self.race(mask, bound, reference) if racing else self.bounded_loss(mask, bound)
+                new_losses.append(loss)
+                # Candidates rejected early carry no predictions and only an estimated loss
+                exact.append(preds is not None)
+        else:
+            new_losses, _ = self.compute_losses(missing_masks)
+            exact = [True] * len(missing_masks)
+        for i, mask, loss, is_exact in zip(missing, missing_masks, new_losses, exact):
+            losses[i] = loss
+            # Only the loss of a candidate is kept; the selectors never ask for its predictions again
+            if self.cache is not None and is_exact:
+                self.cache.put(self.model, mask, self.split, None, loss)
+        return losses
+
+    def compute_losses(self, masks):
+        """Score masks without the cache, returning their losses and predictions (None where not kept)."""
+        if self.pool is not None and len(masks) > 1:
+            # The pool keeps the state of the last scorer that published to it
+            if self.pool_state is None or self.pool_state != self.pool.path:
+                self.pool_state = self.pool.publish(self.model, self.X, self.y, self.data_type, self.max_batch_rows)
+            chunks = [chunk for chunk in np.array_split(np.asarray(masks), self.n_jobs) if len(chunk)]
+            losses = []
+            for chunk_losses in self.pool.map(self.pool_state, chunks):
+                losses.extend(chunk_losses)
+            return losses, [None] * len(masks)
+        if self.batch_size == 1 or len(masks) == 1:
+            preds = [self.predict_mask(mask) for mask in masks]
+            return [float(self.criterion(mask_preds, self.y)) for mask_preds in preds], preds
+        return self.stacked_losses(masks, return_preds=True)
+
+    def predict_mask(self, mask):
+        """Predict the split under a single mask."""
+        return predict_split(self.model, self.X * mask, self.data_type)
+
+    def predict_rows(self, mask, rows):
+        """Predict the given rows of the split under a single mask."""
+        return predict_split(self.model, np.asarray(self.X)[rows] * mask, self.data_type)
+
+    def bounded_loss(self, mask, bound):
+        """Score mask abort_rows rows at a time; return (loss, predictions), or (partial loss, None) on abort."""
+        labels = np.asarray(self.y)
+        n_samples = len(labels)
+        preds = []
+        total = 0.0
+        for start in range(0, n_samples, self.abort_rows):
+            rows = np.arange(start, min(start + self.abort_rows, n_samples))
+            rows_preds = np.asarray(self.predict_rows(mask, rows))
+            preds.append(rows_preds)
+            total += sample_losses(rows_preds, labels[rows], self.data_type, self.classes).sum()
+            if total / n_samples > bound and rows[-1] < n_samples - 1:
+                return total / n_samples, None
+        full_preds = np.concatenate(preds)
+        return float(self.criterion(full_preds, self.y)), full_preds
+
+    def stratified_order(self):
+        """Return the rows in an order whose every prefix is stratified by class, or by target decile for regression."""
+        labels = np.asarray(self.y).ravel()
+        if self.data_type == "Classification":
+            strata = labels
+        else:
+            strata = np.digitize(labels, np.quantile(labels, np.linspace(0, 1, 11)[1:-1]))
+        random_state = np.random.RandomState(0)
+        keys = np.empty(len(labels))
+        for stratum in np.unique(strata):
+            rows = np.flatnonzero(strata == stratum)
+            keys[rows] = (random_state.permutation(len(rows)) + random_state.rand(len(rows))) / len(rows)
+        return np.argsort(keys, kind="stable")
+
+    def race(self, mask, bound, reference):
+        """Score mask on growing subsamples; return (loss, predictions), with predictions None on early rejection."""
+        if self.racing_order is None:
+            self.racing_order = self.stratified_order()
+        reference_key = np.asarray(reference).tobytes()
+        if self.reference_key != reference_key:
+            reference_preds, _ = self.evaluate(reference)
+            self.reference_losses = sample_losses(np.asarray(reference_preds), self.y, self.data_type, self.classes)
+            self.reference_key = reference_key
+            self.reference_loss = float(self.criterion(reference_preds, self.y))
+
+        n_samples = len(self.racing_order)
+        preds = []
+        differences = []
+        scored = 0
+        size = min(self.racing_rows, n_samples)
+        while True:
+            rows = self.racing_order[scored:size]
+            rows_preds = np.asarray(self.predict_rows(mask, rows))
+            preds.append(rows_preds)
+            differences.append(sample_losses(rows_preds, np.asarray(self.y)[rows], self.data_type, self.classes) -
+                               self.reference_losses[rows])
+            scored = size
+            if scored == n_samples:
+                break
+            difference = np.concatenate(differences)
+            # Standard error of the mean difference, with the finite population correction
+            error = difference.std(ddof=1) / np.sqrt(scored) * np.sqrt(1 - scored / n_samples)
+            estimate = self.reference_loss + difference.mean()
+            if estimate - self.racing_z * error > bound:
+                return estimate, None
+            if estimate + self.racing_z * error < bound:
+                # Clearly below the bound: the exact loss is needed, so score the rest in one call
+                size = n_samples
+            else:
+                size = min(2 * size, n_samples)
+
+        order_preds = np.concatenate(preds)
+        full_preds = np.empty_like(order_preds)
+        full_preds[self.racing_order] = order_preds
+        return float(self.criterion(full_preds, self.y)), full_preds
+
+    def stacked_losses(self, masks, return_preds=False):
+        """Score the masks by predicting stacked masked copies of the split."""
+        X = np.asarray(self.X)
+        n_samples = X.shape[0]
+        chunk = max(1, self.max_batch_rows // max(n_samples, 1))
+        losses = []
+        all_preds = []
+        for start in range(0, len(masks), chunk):
+            chunk_masks = np.asarray(masks[start:start + chunk], dtype=X.dtype)
+            stacked = (X[None, :, :] * chunk_masks[:, None, :]).reshape(-1, X.shape[1])
+            preds = np.asarray(predict_split(self.model, stacked, self.data_type))
+            preds = preds.reshape((len(chunk_masks), n_samples) + preds.shape[1:])
+            losses.extend(batch_losses(preds, self.y, self.data_type, self.classes).tolist())
+            if return_preds:
+                all_preds.extend(np.array(candidate_preds) for candidate_preds in preds)
+        if return_preds:
+            return losses, all_preds
+        return losses
+
+    def commit(self, mask):
+        """Record that the mask search accepted ``mask``. Scorers that keep per-mask state override this."""
+
+    def close(self):
+        """Shut down the scorer's own worker pool, if any."""
+        if self.owns_pool:
+            self.pool.close()
+        self.pool = None
+
+
+class CandidateScheduler:
+    """Hands out feature indices for the mask search in passes over the features that are still in the mask.
+
+    A pass visits every remaining feature once, in ascending order of scores with ties in random order, or in random
+    order when no scores are given. Features the search drops are removed with discard(). The pass is kept as a
+    doubly linked list, so draw() and discard() do O(1) work; the ordering is computed once per pass.
+
+    draw() returns None when no features are left, and with single_pass=True also once the first pass is
+    exhausted instead of starting another.
+    """
+
+    def __init__(self, n_features, scores=None, random_state=None, single_pass=False):
+        self.n_features = n_features
+        self.scores = None if scores is None else np.asarray(scores, dtype=float)
+        self.random_state = check_random_state(random_state)
+        self.single_pass = single_pass
+        self.passes = 0
+        self.active = np.ones(n_features, dtype=bool)
+        self.n_active = n_features
+        # Node n_features is the sentinel of the circular list
+        self.next = [n_features] * (n_features + 1)
+        self.prev = [n_features] * (n_features + 1)
+        self.in_pass = [False] * n_features
+
+    def ordering(self):
+        """Return the remaining features in the order of the next pass."""
+        order = self.random_state.permutation(np.flatnonzero(self.active))
+        if self.scores is not None:
+            order = order[np.argsort(self.scores[order], kind="stable")]
+        return order.tolist()
+
+    def new_pass(self):
+        order = self.ordering()
+        sentinel = self.n_features
+        links = [sentinel] + order + [sentinel]
+        for prev_idx, idx, next_idx in zip(links, links[1:], links[2:]):
+            self.prev[idx] = prev_idx
+            self.next[idx] = next_idx
+            self.in_pass[idx] = True
+        self.next[sentinel] = order[0]
+        self.prev[sentinel] = order[-1]
+        self.passes += 1
+
+    def unlink(self, idx):
+        prev_idx, next_idx = self.prev[idx], self.next[idx]
+        self.next[prev_idx] = next_idx
+        self.prev[next_idx] = prev_idx
+        self.in_pass[idx] = False
+
+    def draw(self):
+        """Return the next feature of the current pass, starting a new pass when it is exhausted."""
+        if self.next[self.n_features] == self.n_features:
+            if (self.single_pass and self.passes) or not self.n_active:
+                return None
+            self.new_pass()
+        idx = self.next[self.n_features]
+        self.unlink(idx)
+        return idx
+
+    def discard(self, features):
+        """Remove features from this and all later passes."""
+        for idx in np.atleast_1d(features).tolist():
+            if self.active[idx]:
+                self.active[idx] = False
+                self.n_active -= 1
+                if self.in_pass[idx]:
+                    self.unlink(idx)
+
+    def reject(self, candidate):
+        """Record that dropping candidate was rejected; return whether this counts against the search's patience."""
+        return True
+
+
+class GroupCandidateScheduler(CandidateScheduler):
+    """CandidateScheduler that tries to drop blocks of features together before single features.
+
+    Each pass splits the remaining features, in the scheduler's order, into two halves. A block whose drop is
+    rejected is split in two and its halves are tried next, so only blocks that contain a feature that matters are
+    refined. Only the rejection of a single feature counts against the search's patience. When k of d features
+    matter, a pass scores O(k log d) candidates instead of d.
+    """
+
+    def __init__(self, n_features, scores=None, random_state=None, single_pass=False):
+        super().__init__(n_features, scores, random_state, single_pass)
+        # Blocks still to try, the next one last
+        self.blocks = []
+
+    def push_halves(self, block):
+        middle = len(block) // 2
+        self.blocks.append(block[middle:])
+        self.blocks.append(block[:middle])
+
+    def draw(self):
+        """Return the next block of features as an index array."""
+        while True:
+            if not self.blocks:
+                if (self.single_pass and self.passes) or not self.n_active:
+                    return None
+                self.blocks.append(self.ordering())
+                self.passes += 1
+            block = [idx for idx in self.blocks.pop() if self.active[idx]]
+            if len(block) > 1 and len(block) == self.n_active:
+                # Dropping every remaining feature is never accepted
+                self.push_halves(block)
+            elif block:
+                return np.array(block)
+
+    def reject(self, candidate):
+        if len(candidate) > 1:
+            self.push_halves(list(candidate))
+            return False
+        return True
+
+
+def _pool_context():
+    # LightGBM and XGBoost hold OpenMP thread pools that are not safe to fork, so workers are started from a clean
+    # interpreter instead of forking the trained process.
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+class MaskScoringPool:
+    """Worker processes that score candidate masks, started once and shared by the scorers of every outer iteration.
+
+    Each scorer publishes its model and split once, with joblib.dump to a file in /dev/shm when it exists, and the
+    workers load and keep the latest one on their first batch for it; only the masks travel per batch. Every worker
+    predicts with n_threads threads, thread_budget.n_cores // n_jobs by default, so that the pool does not start
+    n_jobs times as many threads as there are cores. Use it as a context manager, or call close(), to shut it down.
+    """
+
+    def __init__(self, n_jobs, n_threads=None):
+        self.n_jobs = n_jobs
+        self.n_threads = n_threads or max(1, thread_budget.n_cores // n_jobs)
+        self.executor = ProcessPoolExecutor(max_workers=n_jobs, mp_context=_pool_context(),
+                                            initializer=_init_scorer_worker, initargs=(self.n_threads,))
+        parent = "/dev/shm" if os.access("/dev/shm", os.W_OK) else None
+        self.directory = tempfile.mkdtemp(prefix="afs_bm_scorer_", dir=parent)
+        self.published = 0
+        self.path = None
+
+    def publish(self, model, X, y, data_type, max_batch_rows):
+        """Write the state of a scorer for the workers, replacing the previous one; return its path."""
+        if self.path is not None:
+            os.remove(self.path)
+        self.path = os.path.join(self.directory, f"{self.published}.joblib")
+        joblib.dump((model, np.asarray(X), np.asarray(y), data_type, max_batch_rows), self.path)
+        self.published += 1
+        return self.path
+
+    def map(self, path, chunks):
+        """Return the losses of every chunk of masks, scored by the workers under the state at path, in order."""
+        return self.executor.map(_score_masks_in_worker, itertools.repeat(path, len(chunks)), chunks)
+
+    def close(self):
+        self.executor.shutdown()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+@contextmanager
+def scoring_pool(n_jobs):
+    """Yield a MaskScoringPool of n_jobs workers, or None when n_jobs <= 1, and shut it down on exit."""
+    if n_jobs <= 1:
+        yield None
+        return
+    with MaskScoringPool(n_jobs) as pool:
+        yield pool
+
+
+# Per worker process: the thread limit, and the path and scorer of the last state loaded
+_worker_threads = 1
+_worker_path = None
+_worker_scorer = None
+
+
+def _init_scorer_worker(n_threads):
+    global _worker_threads
+    _worker_threads = n_threads
+
+
+def _score_masks_in_worker(path, masks):
+    global _worker_path, _worker_scorer
+    if path != _worker_path:
+        model, X, y, data_type, max_batch_rows = joblib.load(path)
+        ThreadBudget.set_threads(model, _worker_threads)
+        if hasattr(model, "get_booster"):
+            model.get_booster().set_param("nthread", _worker_threads)
+        # Also covers the OpenMP runtime of LightGBM and the BLAS of the MLP, which may only be loaded by now
+        threadpool_limits(_worker_threads)
+        _worker_scorer = MaskScorer(model, X, y, data_type, criterion=None, max_batch_rows=max_batch_rows)
+        _worker_path = path
+    return _worker_scorer.stacked_losses(masks)
@@ -6,8 +6,10 @@ import numpy as np
 import pandas as pd
 import torch
 from sklearn.feature_selection import mutual_info_classif, mutual_info_regression
-from sklearn.metrics import log_loss, mean_squared_error
-from sklearn.model_selection import RandomizedSearchCV, GridSearchCV
+from sklearn.model_selection import GridSearchCV
+
+from Models.Hyperparameter_Search import make_search, search_cache
+from Models.Loss_Kernels import fast_log_loss, fast_mean_squared_error
 
 
 def set_random_seeds(seed):
@@ -36,7 +38,7 @@ class Mutual_Inf_LightGBM:
     """Wrapper for LightGBM model with utility functions."""
 
     def __init__(self, params, param_grid, X_train, X_val, X_test, y_train, y_val, y_test,
-                 data_type, dir_name):
+                 data_type, dir_name, search_mode="random"):
         # Initialization with dataset and parameters
         self.params = params
         self.param_grid = param_grid
@@ -48,6 +50,7 @@ class Mutual_Inf_LightGBM:
         self.y_test = y_test
         self.data_type = data_type
         self.dir_name = dir_name
+        self.search_mode = search_mode
 
         self.X_train_mi = X_train
         self.X_val_mi = X_val
@@ -93,16 +96,15 @@ class Mutual_Inf_LightGBM:
             self.params["feature_name"] = selected_features
 
     def Train_with_RandomSearch(self):
-        """Train the model using random search for hyperparameter optimization."""
+        """Train the model using random search, successive halving or the binned search, as search_mode selects."""
         best_loss = np.inf
         best_n_features_mi = 10000
         for n_features_mi in range(2, self.X_train.shape[1] + 1):
             self.MI_Feature_Selection(n_features_mi)
-            random_search = RandomizedSearchCV(self.base_model, param_distributions=self.param_grid, n_iter=100, cv=5,
-                                               verbose=-1, n_jobs=-1)
+            random_search = make_search(self.base_model, self.param_grid, self.search_mode, n_iter=100)
             callbacks = [lgb.early_stopping(10, verbose=0), lgb.log_evaluation(period=0)]
-            random_search.fit(self.X_train_mi, self.y_train, eval_set=(self.X_val_mi, self.y_val),
-                              callbacks=callbacks)
+            search_cache.fit(random_search, self.X_train_mi, self.y_train, eval_set=(self.X_val_mi, self.y_val),
+                             callbacks=callbacks)
             self.best_params = random_search.best_params_
             self.searched_trained_model = random_search.best_estimator_
             loss = random_search.best_score_
@@ -111,11 +113,10 @@ class Mutual_Inf_LightGBM:
                 best_n_features_mi = n_features_mi
 
         self.MI_Feature_Selection(best_n_features_mi, best=True)
-        random_search = RandomizedSearchCV(self.base_model, param_distributions=self.param_grid, n_iter=100, cv=5,
-                                           verbose=-1, n_jobs=-1)
+        random_search = make_search(self.base_model, self.param_grid, self.search_mode, n_iter=100)
         callbacks = [lgb.early_stopping(10, verbose=0), lgb.log_evaluation(period=0)]
-        random_search.fit(self.X_train, self.y_train, eval_set=(self.X_val, self.y_val),
-                          callbacks=callbacks)
+        search_cache.fit(random_search, self.X_train, self.y_train, eval_set=(self.X_val, self.y_val),
+                         callbacks=callbacks)
         self.best_params = random_search.best_params_
         self.searched_trained_model = random_search.best_estimator_
 
@@ -126,10 +127,10 @@ class Mutual_Inf_LightGBM:
         best_n_features_mi = 10000
         for n_features_mi in range(2, self.X_train.shape[1] + 1):
             self.MI_Feature_Selection(n_features_mi)
-            grid_search = GridSearchCV(self.base_model, param_grid=self.param_grid, cv=5, verbose=-1, n_jobs=-1)
+            grid_search = GridSearchCV(self.base_model, param_grid=self.param_grid, cv=5, verbose=0, n_jobs=-1)
             callbacks = [lgb.early_stopping(10, verbose=0), lgb.log_evaluation(period=0)]
-            grid_search.fit(self.X_train_mi, self.y_train, eval_set=(self.X_val_mi, self.y_val),
-                            callbacks=callbacks)
+            search_cache.fit(grid_search, self.X_train_mi, self.y_train, eval_set=(self.X_val_mi, self.y_val),
+                             callbacks=callbacks)
             self.best_params = grid_search.best_params_
             self.searched_trained_model = grid_search.best_estimator_
             loss = grid_search.best_score_
@@ -138,10 +139,10 @@ class Mutual_Inf_LightGBM:
                 best_n_features_mi = n_features_mi
 
         self.MI_Feature_Selection(best_n_features_mi, best=True)
-        grid_search = GridSearchCV(self.base_model, param_grid=self.param_grid, cv=5, verbose=-1, n_jobs=-1)
+        grid_search = GridSearchCV(self.base_model, param_grid=self.param_grid, cv=5, verbose=0, n_jobs=-1)
         callbacks = [lgb.early_stopping(10, verbose=0), lgb.log_evaluation(period=0)]
-        grid_search.fit(self.X_train, self.y_train, eval_set=(self.X_val, self.y_val),
-                        callbacks=callbacks)
+        search_cache.fit(grid_search, self.X_train, self.y_train, eval_set=(self.X_val, self.y_val),
+                         callbacks=callbacks)
         self.best_params = grid_search.best_params_
         self.searched_trained_model = grid_search.best_estimator_
 
@@ -171,9 +172,9 @@ class Mutual_Inf_LightGBM:
     @staticmethod
     def cross_entropy(preds, labels):
         """Compute cross entropy loss."""
-        return log_loss(labels, preds)
+        return fast_log_loss(labels, preds)
 
     @staticmethod
     def mean_squared_error(preds, labels):
         """Compute mean squared error."""
-        return mean_squared_error(labels, preds)
+        return fast_mean_squared_error(labels, preds)
@@ -6,9 +6,11 @@ import numpy as np
 import pandas as pd
 import torch
 from sklearn.feature_selection import mutual_info_classif, mutual_info_regression
-from sklearn.metrics import log_loss, mean_squared_error
 from sklearn.model_selection import RandomizedSearchCV, GridSearchCV
 
+from Models.Hyperparameter_Search import search_cache
+from Models.Loss_Kernels import fast_log_loss, fast_mean_squared_error
+
 
 def set_random_seeds(seed):
     """Set random seed for reproducibility across different libraries."""
@@ -84,17 +86,17 @@ class Mutual_Inf_MLP:
 
 
         random_search = RandomizedSearchCV(self.base_model, param_distributions=self.param_grid, n_iter=100, cv=5,
-                                           verbose=-1, n_jobs=-1)
-        random_search.fit(np.concatenate([self.X_train, self.X_val], axis=0),
-                        np.concatenate([self.y_train, self.y_val]))
+                                           verbose=0, n_jobs=-1)
+        search_cache.fit(random_search, np.concatenate([self.X_train, self.X_val], axis=0),
+                         np.concatenate([self.y_train, self.y_val]))
         self.best_params = random_search.best_params_
         self.searched_trained_model = random_search.best_estimator_
 
     def Train_with_GridSearch(self):
         """Train the model using grid search for hyperparameter optimization."""
-        grid_search = GridSearchCV(self.base_model, param_grid=self.param_grid, cv=5, verbose=-1, n_jobs=-1)
-        grid_search.fit(np.concatenate([self.X_train, self.X_val], axis=0),
-                        np.concatenate([self.y_train, self.y_val]))
+        grid_search = GridSearchCV(self.base_model, param_grid=self.param_grid, cv=5, verbose=0, n_jobs=-1)
+        search_cache.fit(grid_search, np.concatenate([self.X_train, self.X_val], axis=0),
+                         np.concatenate([self.y_train, self.y_val]))
         self.best_params = grid_search.best_params_
         self.searched_trained_model = grid_search.best_estimator_
 
@@ -124,9 +126,9 @@ class Mutual_Inf_MLP:
     @staticmethod
     def cross_entropy(preds, labels):
         """Compute cross entropy loss."""
-        return log_loss(labels, preds)
+        return fast_log_loss(labels, preds)
 
     @staticmethod
     def mean_squared_error(preds, labels):
         """Compute mean squared error."""
-        return mean_squared_error(labels, preds)
+        return fast_mean_squared_error(labels, preds)
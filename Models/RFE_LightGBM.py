@@ -5,8 +5,10 @@ import lightgbm as lgb
 import numpy as np
 import torch
 from sklearn.feature_selection import RFE
-from sklearn.metrics import log_loss, mean_squared_error
-from sklearn.model_selection import RandomizedSearchCV, GridSearchCV
+from sklearn.model_selection import GridSearchCV
+
+from Models.Hyperparameter_Search import make_search, search_cache
+from Models.Loss_Kernels import fast_log_loss, fast_mean_squared_error
 
 
 def set_random_seeds(seed):
@@ -35,7 +37,7 @@ class RFE_LightGBM:
     """Wrapper for LightGBM model with utility functions."""
 
     def __init__(self, params, param_grid, X_train, X_val, X_test, y_train, y_val, y_test,
-                 data_type, dir_name):
+                 data_type, dir_name, search_mode="random"):
         # Initialization with dataset and parameters
         self.params = params
         self.param_grid = param_grid
@@ -47,6 +49,7 @@ class RFE_LightGBM:
         self.y_test = y_test
         self.data_type = data_type
         self.dir_name = dir_name
+        self.search_mode = search_mode
 
         if data_type == "Classification":
             self.base_model = lgb.LGBMClassifier(**self.params)
@@ -97,22 +100,21 @@ class RFE_LightGBM:
             print(f"Selected features for RFE LGBM: {features}")
 
     def Train_with_RandomSearch(self):
-        """Train the model using random search for hyperparameter optimization."""
+        """Train the model using random search, successive halving or the binned search, as search_mode selects."""
 
-        random_search = RandomizedSearchCV(self.base_model, param_distributions=self.param_grid, n_iter=100, cv=5,
-                                           verbose=-1, n_jobs=-1)
+        random_search = make_search(self.base_model, self.param_grid, self.search_mode, n_iter=100)
         callbacks = [lgb.early_stopping(10, verbose=0), lgb.log_evaluation(period=0)]
-        random_search.fit(self.X_train, self.y_train, eval_set=(self.X_val, self.y_val),
-                          callbacks=callbacks)
+        search_cache.fit(random_search, self.X_train, self.y_train, eval_set=(self.X_val, self.y_val),
+                         callbacks=callbacks)
         self.best_params = random_search.best_params_
         self.searched_trained_model = random_search.best_estimator_
 
     def Train_with_GridSearch(self):
         """Train the model using grid search for hyperparameter optimization."""
-        grid_search = GridSearchCV(self.base_model, param_grid=self.param_grid, cv=5, verbose=-1, n_jobs=-1)
+        grid_search = GridSearchCV(self.base_model, param_grid=self.param_grid, cv=5, verbose=0, n_jobs=-1)
         callbacks = [lgb.early_stopping(10, verbose=0), lgb.log_evaluation(period=0)]
-        grid_search.fit(self.X_train, self.y_train, eval_set=(self.X_val, self.y_val),
-                        callbacks=callbacks)
+        search_cache.fit(grid_search, self.X_train, self.y_train, eval_set=(self.X_val, self.y_val),
+                         callbacks=callbacks)
         self.best_params = grid_search.best_params_
         self.searched_trained_model = grid_search.best_estimator_
 
@@ -142,9 +144,9 @@ class RFE_LightGBM:
     @staticmethod
     def cross_entropy(preds, labels):
         """Compute cross entropy loss."""
-        return log_loss(labels, preds)
+        return fast_log_loss(labels, preds)
 
     @staticmethod
     def mean_squared_error(preds, labels):
         """Compute mean squared error."""
-        return mean_squared_error(labels, preds)
+        return fast_mean_squared_error(labels, preds)
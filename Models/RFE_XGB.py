@@ -5,8 +5,10 @@ import numpy as np
 import torch
 import xgboost as xgb
 from sklearn.feature_selection import RFE
-from sklearn.metrics import log_loss, mean_squared_error
-from sklearn.model_selection import RandomizedSearchCV, GridSearchCV
+
+from Models.Hyperparameter_Search import make_grid_search, make_search, search_cache
+from Models.Loss_Kernels import fast_log_loss, fast_mean_squared_error
+from Models.XGBoost_Engine import device_params
 
 
 def set_random_seeds(seed):
@@ -35,7 +37,7 @@ class RFE_XGB:
     """Wrapper for XgBoost model with utility functions."""
 
     def __init__(self, params, param_grid, X_train, X_val, X_test, y_train, y_val, y_test,
-                 data_type, dir_name):
+                 data_type, dir_name, search_mode="random"):
         # Initialization with dataset and parameters
         self.params = params
         self.param_grid = param_grid
@@ -47,9 +49,10 @@ class RFE_XGB:
         self.y_test = y_test
         self.data_type = data_type
         self.dir_name = dir_name
+        self.search_mode = search_mode
 
         if data_type == "Classification":
-            self.base_model = xgb.XGBClassifier(**self.params, device="cuda", tree_method="gpu_hist")
+            self.base_model = xgb.XGBClassifier(**device_params(self.params))
             best_loss = np.inf
             for i in range(2, 21):
                 self.perform_RFE(n_features_to_select=i)
@@ -63,7 +66,7 @@ class RFE_XGB:
             self.criterion = self.cross_entropy
 
         else:
-            self.base_model = xgb.XGBRegressor(**self.params, device="cuda", tree_method="gpu_hist")
+            self.base_model = xgb.XGBRegressor(**device_params(self.params))
             best_loss = np.inf
             for i in range(2, 21):
                 self.perform_RFE(n_features_to_select=i)
@@ -97,18 +100,17 @@ class RFE_XGB:
             print(f"Selected features for RFE XGB: {features}")
 
     def Train_with_RandomSearch(self):
-        """Train the model using random search for hyperparameter optimization."""
+        """Train the model using random search, successive halving or the native search, as search_mode selects."""
 
-        random_search = RandomizedSearchCV(self.base_model, param_distributions=self.param_grid, n_iter=15, cv=5,
-                                           verbose=-1, n_jobs=-1)
-        random_search.fit(self.X_train, self.y_train, eval_set=[(self.X_val, self.y_val)], verbose=False)
+        random_search = make_search(self.base_model, self.param_grid, self.search_mode, n_iter=15)
+        search_cache.fit(random_search, self.X_train, self.y_train, eval_set=[(self.X_val, self.y_val)], verbose=False)
         self.best_params = random_search.best_params_
         self.searched_trained_model = random_search.best_estimator_
 
     def Train_with_GridSearch(self):
         """Train the model using grid search for hyperparameter optimization."""
-        grid_search = GridSearchCV(self.base_model, param_grid=self.param_grid, cv=5, verbose=-1, n_jobs=-1)
-        grid_search.fit(self.X_train, self.y_train, eval_set=[(self.X_val, self.y_val)], verbose=False)
+        grid_search = make_grid_search(self.base_model, self.param_grid)
+        search_cache.fit(grid_search, self.X_train, self.y_train, eval_set=[(self.X_val, self.y_val)], verbose=False)
         self.best_params = grid_search.best_params_
         self.searched_trained_model = grid_search.best_estimator_
 
@@ -139,9 +141,9 @@ class RFE_XGB:
     @staticmethod
     def cross_entropy(preds, labels):
         """Compute cross entropy loss."""
-        return log_loss(labels, preds)
+        return fast_log_loss(labels, preds)
 
     @staticmethod
     def mean_squared_error(preds, labels):
         """Compute mean squared error."""
-        return mean_squared_error(labels, preds)
+        return fast_mean_squared_error(labels, preds)
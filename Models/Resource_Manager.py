@@ -0,0 +1,164 @@
+import atexit
+import os
+import shutil
+import tempfile
+import weakref
+from contextlib import contextmanager
+
+import joblib
+import numpy as np
+import pandas as pd
+
+
+class ThreadBudget:
+    """Splits the cores between parallel hyperparameter-search fits and the threads each fit may use.
+
+    With search_jobs set, a search runs search_jobs fits at a time, each booster with threads_per_job threads
+    (n_jobs) and the BLAS of each worker process, which the scikit-learn MLP uses, limited to as many. Without it,
+    searches keep their original settings: one parallel fit per core (n_jobs=-1), each with the threads its
+    estimator asks for, so every booster may start one thread per core. Benchmarks/thread_budget_benchmark.py times
+    both on a machine.
+    """
+
+    def __init__(self, n_cores=None, search_jobs=None):
+        self.configure(n_cores, search_jobs)
+
+    def configure(self, n_cores=None, search_jobs=None):
+        """Set the cores to use (all by default) and the number of parallel fits (None keeps n_jobs=-1)."""
+        self.n_cores = max(1, n_cores or os.cpu_count() or 1)
+        self.search_jobs = None if search_jobs is None else min(max(1, search_jobs), self.n_cores)
+
+    @property
+    def parallel_fits(self):
+        """Number of fits a search runs at a time."""
+        return self.n_cores if self.search_jobs is None else self.search_jobs
+
+    @property
+    def threads_per_job(self):
+        return max(1, self.n_cores // self.parallel_fits)
+
+    @staticmethod
+    def set_threads(estimator, n_threads):
+        """Set n_jobs on estimator if it has one."""
+        if "n_jobs" in estimator.get_params(deep=False):
+            estimator.set_params(n_jobs=n_threads)
+
+    @contextmanager
+    def search(self, search):
+        """Run the fit of search within the budget, or with n_jobs=-1 when search_jobs is not set.
+
+        The estimator keeps its own n_jobs afterwards, and the refitted best_estimator_ gets all the cores, since it is
+        only used in the main process.
+        """
+        if self.search_jobs is None:
+            search.set_params(n_jobs=-1)
+            yield search
+            return
+        search.set_params(n_jobs=self.search_jobs)
+        # The estimator is usually the wrapper's base_model, which is also fitted outside of searches
+        estimator_threads = search.estimator.get_params(deep=False).get("n_jobs")
+        self.set_threads(search.estimator, self.threads_per_job)
+        try:
+            with joblib.parallel_config(backend="loky", inner_max_num_threads=self.threads_per_job):
+                yield search
+        finally:
+            self.set_threads(search.estimator, estimator_threads)
+        if hasattr(search, "best_estimator_"):
+            self.set_threads(search.best_estimator_, self.n_cores)
+
+
+class SharedArrayStore:
+    """Memory-mapped copies of search data, which joblib hands to its worker processes by file reference.
+
+    joblib already memory-maps large arrays for loky workers, but hashes and dumps them again for every search. Here
+    every array is written once per split, to /dev/shm when it exists, and kept while the array it was copied from is
+    alive, so later searches of the same split, by the warm-start fallback, another search stage or another wrapper,
+    map the same file. When a selector drops features its masked split is replaced, the old array is freed and its
+    copy is deleted. The copies take at most max_nbytes; arrays that do not fit are left to joblib. Arrays are
+    recognised by identity, hashing them would cost more than writing them, so they must not be modified in place.
+    """
+
+    def __init__(self, min_nbytes=1 << 20, max_nbytes=1 << 30):
+        self.enabled = True
+        self.min_nbytes = min_nbytes
+        self.max_nbytes = max_nbytes
+        self.nbytes = 0
+        self.directory = None
+        # id(source) -> (file path, memory-mapped copy); entries are removed when their source is garbage collected
+        self.entries = {}
+        self.writes = 0
+        self.reuses = 0
+
+    def folder(self):
+        if self.directory is None:
+            parent = "/dev/shm" if os.access("/dev/shm", os.W_OK) else None
+            self.directory = tempfile.mkdtemp(prefix="afs_bm_shared_", dir=parent)
+            atexit.register(shutil.rmtree, self.directory, True)
+        return self.directory
+
+    def mapped(self, source, values):
+        """Return a read-only memory-mapped copy of values, the data of source, writing it once per source.
+
+        values is returned as is when its copy would take the store over max_nbytes.
+        """
+        key = id(source)
+        if key in self.entries:
+            self.reuses += 1
+            return self.entries[key][1]
+        if self.nbytes + values.nbytes > self.max_nbytes:
+            return values
+        path = os.path.join(self.folder(), f"{self.writes}.npy")
+        np.save(path, values)
+        self.entries[key] = (path, np.load(path, mmap_mode="r"))
+        self.nbytes += values.nbytes
+        self.writes += 1
+        weakref.finalize(source, self.release, key)
+        return self.entries[key][1]
+
+    def release(self, key):
+        """Delete the copy stored under key. Workers that still map the file keep it until they unmap it."""
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        path, copy = entry
+        self.nbytes -= copy.nbytes
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def share(self, value):
+        """Return value with its large arrays, DataFrames and Series replaced by memory-mapped equivalents.
+
+        Tuples, lists and dicts, such as eval_set fit parameters, are searched recursively.
+        """
+        if not self.enabled:
+            return value
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            values = value.to_numpy()
+            if values.dtype == object or values.nbytes < self.min_nbytes:
+                return value
+            if isinstance(value, pd.Series):
+                return pd.Series(self.mapped(value, values), index=value.index, name=value.name, copy=False)
+            return pd.DataFrame(self.mapped(value, values), index=value.index, columns=value.columns, copy=False)
+        if isinstance(value, np.ndarray) and not isinstance(value, np.memmap):
+            if value.dtype == object or value.nbytes < self.min_nbytes:
+                return value
+            return self.mapped(value, value)
+        if isinstance(value, tuple):
+            return tuple(self.share(item) for item in value)
+        if isinstance(value, list):
+            return [self.share(item) for item in value]
+        if isinstance(value, dict):
+            return {key: self.share(item) for key, item in value.items()}
+        return value
+
+    def stats(self):
+        """Return how many arrays were written and how many were reused."""
+        return {"writes": self.writes, "reuses": self.reuses, "size": len(self.entries), "nbytes": self.nbytes}
+
+
+# Shared by every hyperparameter search in Models/; the runners configure it from --n_cores and --search_jobs
+thread_budget = ThreadBudget()
+# Search data for the worker processes of thread_budget
+shared_arrays = SharedArrayStore()
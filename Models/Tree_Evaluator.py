@@ -0,0 +1,424 @@
+import json
+import warnings
+
+import numpy as np
+import xgboost as xgb
+
+from Models.Mask_Search import MaskScorer, batch_losses, predict_split
+
+# Missing-value handling of a split, following LightGBM's missing_type
+MISSING_NONE, MISSING_ZERO, MISSING_NAN = 0, 1, 2
+# LightGBM treats |x| <= kZeroThreshold as zero
+ZERO_THRESHOLD = 1e-35
+
+IDENTITY_OBJECTIVES = {"regression", "regression_l2", "regression_l1", "huber", "fair", "quantile", "mape",
+                       "reg:squarederror", "reg:linear", "reg:absoluteerror", "reg:pseudohubererror",
+                       "reg:quantileerror"}
+EXP_OBJECTIVES = {"poisson", "gamma", "tweedie"}
+SIGMOID_OBJECTIVES = {"binary", "binary:logistic", "reg:logistic"}
+SOFTMAX_OBJECTIVES = {"multiclass", "softmax", "multi:softprob", "multi:softmax"}
+
+
+class FlatTreeEnsemble:
+    """Binary-output tree ensemble flattened into NumPy arrays, one entry per node across all trees.
+
+    Leaves point to themselves, so every row can descend all trees in lock step for a fixed number of levels.
+    """
+
+    def __init__(self, trees, n_features, link, link_scale=1.0, base_margin=0.0, strict=False, dtype=np.float64):
+        sizes = [len(nodes) for nodes in trees]
+        self.roots = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.intp)
+        n_nodes = int(sum(sizes))
+        self.feature = np.zeros(n_nodes, dtype=np.intp)
+        self.threshold = np.zeros(n_nodes)
+        self.left = np.arange(n_nodes, dtype=np.intp)
+        self.right = np.arange(n_nodes, dtype=np.intp)
+        self.default_left = np.zeros(n_nodes, dtype=bool)
+        self.missing_type = np.zeros(n_nodes, dtype=np.int8)
+        self.value = np.zeros(n_nodes)
+        self.is_leaf = np.zeros(n_nodes, dtype=bool)
+        self.tree_of_node = np.repeat(np.arange(len(trees)), sizes)
+        self.tree_depth = np.zeros(len(trees), dtype=np.intp)
+
+        for tree_idx, (root, nodes) in enumerate(zip(self.roots, trees)):
+            depth = np.zeros(len(nodes), dtype=np.intp)
+            for local_idx, node in enumerate(nodes):
+                idx = root + local_idx
+                if "value" in node:
+                    self.is_leaf[idx] = True
+                    self.value[idx] = node["value"]
+                    continue
+                self.feature[idx] = node["feature"]
+                self.threshold[idx] = node["threshold"]
+                self.left[idx] = root + node["left"]
+                self.right[idx] = root + node["right"]
+                self.default_left[idx] = node["default_left"]
+                self.missing_type[idx] = node["missing_type"]
+                # Nodes are stored in preorder, so a parent's depth is known before its children's
+                depth[node["left"]] = depth[node["right"]] = depth[local_idx] + 1
+            self.tree_depth[tree_idx] = depth.max(initial=0)
+
+        if dtype == np.float32:
+            # Compare against the float32 thresholds the booster actually uses, not their printed decimal values
+            self.threshold = self.threshold.astype(np.float32).astype(np.float64)
+
+        self.n_trees = len(trees)
+        self.n_features = n_features
+        self.link = link
+        self.link_scale = link_scale
+        self.base_margin = base_margin
+        self.strict = strict
+        self.dtype = dtype
+
+        split_nodes = ~self.is_leaf
+        self.feature_trees = [np.unique(self.tree_of_node[split_nodes & (self.feature == j)])
+                              for j in range(n_features)]
+
+    @classmethod
+    def from_model(cls, model, n_features):
+        """Build the ensemble from a fitted LightGBM or XGBoost scikit-learn model.
+
+        Raises NotImplementedError for models this evaluator cannot reproduce (multiclass, categorical splits,
+        non-tree boosters, unsupported objectives).
+        """
+        if hasattr(model, "booster_"):
+            return cls._from_lightgbm(model.booster_, n_features)
+        if hasattr(model, "get_booster"):
+            return cls._from_xgboost(model.get_booster(), n_features)
+        raise NotImplementedError(f"No tree evaluator for {type(model).__name__}")
+
+    @classmethod
+    def _from_lightgbm(cls, booster, n_features):
+        # dump_model() dumps up to the best iteration when there is one, matching what predict() uses
+        dump = booster.dump_model()
+        if dump.get("num_class", 1) != 1 or dump.get("average_output", False):
+            raise NotImplementedError("Only single-output boosted LightGBM models are supported")
+        objective = dump.get("objective", "regression").split()
+        link, link_scale = _link_for(objective[0])
+        for option in objective[1:]:
+            if option.startswith("sigmoid:"):
+                link_scale = float(option.split(":")[1])
+
+        trees = []
+        for tree_info in dump["tree_info"]:
+            nodes = []
+            _walk_lightgbm(tree_info["tree_structure"], nodes)
+            trees.append(nodes)
+        return cls(trees, n_features, link, link_scale=link_scale)
+
+    @classmethod
+    def _from_xgboost(cls, booster, n_features):
+        learner = json.loads(booster.save_config())["learner"]
+        if learner["gradient_booster"]["name"] != "gbtree":
+            raise NotImplementedError("Only gbtree XGBoost models are supported")
+        if int(learner["learner_model_param"].get("num_class", "0")) > 1:
+            raise NotImplementedError("Only single-output XGBoost models are supported")
+        link, link_scale = _link_for(learner["objective"]["name"])
+        base_score = float(str(learner["learner_model_param"]["base_score"]).strip("[]"))
+        base_margin = np.log(base_score / (1 - base_score)) if link == "sigmoid" else base_score
+
+        dumps = booster.get_dump(dump_format="json", with_stats=True)
+        best_iteration = booster.attr("best_iteration")
+        if best_iteration is not None:
+            num_parallel_tree = int(learner["gradient_booster"]["gbtree_model_param"]["num_parallel_tree"])
+            dumps = dumps[:(int(best_iteration) + 1) * num_parallel_tree]
+        feature_index = {name: j for j, name in enumerate(booster.feature_names or [])}
+
+        trees = []
+        for tree_dump in dumps:
+            nodes = []
+            _walk_xgboost(json.loads(tree_dump), nodes, feature_index)
+            trees.append(nodes)
+        # XGBoost compares float32 inputs with float32 split conditions, using x < threshold
+        return cls(trees, n_features, link, link_scale=link_scale, base_margin=base_margin, strict=True,
+                   dtype=np.float32)
+
+    def tree_outputs(self, trees, X, mask, max_cells=2000000):
+        """Return the outputs, shape (len(trees), n_samples), of the given trees on X * mask."""
+        n_samples = X.shape[0]
+        outputs = np.empty((len(trees), n_samples))
+        chunk = max(1, max_cells // max(n_samples, 1))
+        rows = np.arange(n_samples)[None, :]
+        for start in range(0, len(trees), chunk):
+            chunk_trees = trees[start:start + chunk]
+            node = np.repeat(self.roots[chunk_trees][:, None], n_samples, axis=1)
+            for _ in range(int(self.tree_depth[chunk_trees].max(initial=0))):
+                feature = self.feature[node]
+                x = X[rows, feature] * mask[feature]
+                missing_type = self.missing_type[node]
+                is_nan = np.isnan(x)
+                x = np.where(is_nan & (missing_type == MISSING_NONE), 0.0, x)
+                is_missing = ((missing_type == MISSING_NAN) & is_nan) | \
+                             ((missing_type == MISSING_ZERO) & (is_nan | (np.abs(x) <= ZERO_THRESHOLD)))
+                threshold = self.threshold[node]
+                go_left = x < threshold if self.strict else x <= threshold
+                go_left = np.where(is_missing, self.default_left[node], go_left)
+                node = np.where(go_left, self.left[node], self.right[node])
+            outputs[start:start + len(chunk_trees)] = self.value[node]
+        return outputs
+
+    def trees_using(self, features):
+        """Return the trees that split on any of the given features."""
+        if len(features) == 1:
+            return self.feature_trees[features[0]]
+        return np.unique(np.concatenate([self.feature_trees[j] for j in features]))
+
+    def output(self, raw, data_type):
+        """Turn raw scores into what predict_proba (classification) or predict (regression) returns."""
+        if self.link == "sigmoid":
+            prediction = 1.0 / (1.0 + np.exp(-self.link_scale * raw))
+        elif self.link == "exp":
+            prediction = np.exp(raw)
+        else:
+            prediction = raw
+        if data_type == "Classification":
+            return np.column_stack([1.0 - prediction, prediction])
+        return prediction
+
+
+class IncrementalTreeScorer(MaskScorer):
+    """MaskScorer that keeps the output of every tree under the current mask.
+
+    Scoring a candidate recomputes only the trees that split on a feature whose mask value differs from the current
+    mask, and adjusts the summed prediction by their change. commit() moves the current mask forward once the
+    search accepts a candidate.
+    """
+
+    def __init__(self, model, X, y, data_type, criterion, ensemble, mask, **kwargs):
+        # Incremental scoring runs in-process; a worker pool would have to rebuild the per-tree state
+        kwargs["n_jobs"] = 1
+        super().__init__(model, X, y, data_type, criterion, **kwargs)
+        self.ensemble = ensemble
+        self.X_array = np.asarray(X, dtype=ensemble.dtype)
+        self.base_mask = np.array(mask, dtype=float)
+        self.tree_values = ensemble.tree_outputs(np.arange(ensemble.n_trees), self.X_array, self.base_mask)
+        self.raw = self.tree_values.sum(axis=0) + ensemble.base_margin
+
+    def changed_trees(self, mask):
+        changed = np.flatnonzero(np.asarray(mask) != self.base_mask)
+        if not len(changed):
+            return changed
+        return self.ensemble.trees_using(changed)
+
+    def raw_prediction(self, mask):
+        trees = self.changed_trees(mask)
+        if not len(trees):
+            return self.raw
+        new_values = self.ensemble.tree_outputs(trees, self.X_array, np.asarray(mask, dtype=float))
+        return self.raw + (new_values.sum(axis=0) - self.tree_values[trees].sum(axis=0))
+
+    def predict_mask(self, mask):
+        return self.ensemble.output(self.raw_prediction(mask), self.data_type)
+
+    def predict_rows(self, mask, rows):
+        trees = self.changed_trees(mask)
+        raw = self.raw[rows]
+        if len(trees):
+            new_values = self.ensemble.tree_outputs(trees, self.X_array[rows], np.asarray(mask, dtype=float))
+            raw = raw + (new_values.sum(axis=0) - self.tree_values[np.ix_(trees, rows)].sum(axis=0))
+        return self.ensemble.output(raw, self.data_type)
+
+    def compute_losses(self, masks):
+        preds = [self.predict_mask(mask) for mask in masks]
+        return [float(self.criterion(mask_preds, self.y)) for mask_preds in preds], preds
+
+    def commit(self, mask):
+        mask = np.array(mask, dtype=float)
+        trees = self.changed_trees(mask)
+        if len(trees):
+            new_values = self.ensemble.tree_outputs(trees, self.X_array, mask)
+            self.raw = self.raw + (new_values.sum(axis=0) - self.tree_values[trees].sum(axis=0))
+            self.tree_values[trees] = new_values
+        self.base_mask = mask
+
+
+def make_tree_mask_scorer(model, X, y, data_type, criterion, mask, incremental=False, **kwargs):
+    """Return an IncrementalTreeScorer when requested and the model is supported, otherwise a MaskScorer.
+
+    The flattened ensemble is checked against the model's own predictions on the current mask before it is used.
+    """
+    if incremental:
+        try:
+            ensemble = FlatTreeEnsemble.from_model(model, X.shape[1])
+        except NotImplementedError as error:
+            warnings.warn(f"Incremental tree scoring disabled: {error}")
+        else:
+            scorer = IncrementalTreeScorer(model, X, y, data_type, criterion, ensemble, mask, **kwargs)
+            expected = np.asarray(predict_split(model, X * mask, data_type))
+            if np.allclose(scorer.predict_mask(mask), expected, rtol=1e-5, atol=1e-7):
+                return scorer
+            warnings.warn("Incremental tree scoring disabled: flattened ensemble does not match the model")
+    return MaskScorer(model, X, y, data_type, criterion, **kwargs)
+
+
+class FeatureUsageIndex:
+    """Trees and split nodes of a fitted LightGBM or XGBoost model that use each feature, and their total gain.
+
+    Only trees that predict() evaluates are indexed, so a feature with no splits cannot change the predictions when
+    it is masked.
+    """
+
+    def __init__(self, feature_nodes, total_gain):
+        self.total_gain = np.asarray(total_gain, dtype=float)
+        self.trees = [np.unique([tree for tree, _ in nodes]).astype(np.intp) for nodes in feature_nodes]
+        self.nodes = [np.array(nodes, dtype=np.intp).reshape(-1, 2) for nodes in feature_nodes]
+        self.split_counts = np.array([len(nodes) for nodes in feature_nodes], dtype=np.intp)
+
+    @classmethod
+    def from_model(cls, model, n_features):
+        feature_nodes = [[] for _ in range(n_features)]
+        total_gain = np.zeros(n_features)
+        if hasattr(model, "booster_"):
+            for tree_idx, tree_info in enumerate(model.booster_.dump_model()["tree_info"]):
+                _usage_lightgbm(tree_info["tree_structure"], tree_idx, feature_nodes, total_gain)
+        elif hasattr(model, "get_booster"):
+            booster = model.get_booster()
+            feature_index = {name: j for j, name in enumerate(booster.feature_names or [])}
+            dumps = booster.get_dump(dump_format="json", with_stats=True)
+            best_iteration = booster.attr("best_iteration")
+            if best_iteration is not None:
+                learner = json.loads(booster.save_config())["learner"]
+                num_parallel_tree = int(learner["gradient_booster"]["gbtree_model_param"]["num_parallel_tree"])
+                num_class = max(1, int(learner["learner_model_param"].get("num_class", "0")))
+                dumps = dumps[:(int(best_iteration) + 1) * num_parallel_tree * num_class]
+            for tree_idx, tree_dump in enumerate(dumps):
+                _usage_xgboost(json.loads(tree_dump), tree_idx, feature_nodes, total_gain, feature_index)
+        else:
+            raise NotImplementedError(f"No feature usage index for {type(model).__name__}")
+        return cls(feature_nodes, total_gain)
+
+    def unused(self, mask):
+        """Return the features that are still in the mask but that no split uses."""
+        return np.flatnonzero((self.split_counts == 0) & (np.asarray(mask) != 0))
+
+
+class ContributionScreen:
+    """Estimates from SHAP values how much the loss changes when each feature of a tree model is dropped.
+
+    The contributions of a LightGBM or XGBoost model on X * mask are computed in one pass. Dropping feature j is
+    estimated by subtracting its contribution from the raw score of every row, which approximates, but does not
+    equal, the effect of zeroing it.
+    """
+
+    def __init__(self, model, X, y, data_type, max_cells=20000000):
+        self.model = model
+        self.X = np.asarray(X)
+        self.y = y
+        self.data_type = data_type
+        self.max_cells = max_cells
+        self.classes = getattr(model, "classes_", None)
+        if hasattr(model, "booster_"):
+            objective = model.objective_ if isinstance(model.objective_, str) else ""
+        else:
+            objective = json.loads(model.get_booster().save_config())["learner"]["objective"]["name"]
+        if objective in SOFTMAX_OBJECTIVES:
+            self.link, self.link_scale = "softmax", 1.0
+        else:
+            self.link, self.link_scale = _link_for(objective)
+
+    def contributions(self, mask):
+        """Return the contributions on X * mask, shape (n_samples, n_outputs, n_features + 1) with the bias last."""
+        X = self.X * mask
+        if hasattr(self.model, "booster_"):
+            contrib = self.model.predict(X, pred_contrib=True)
+        else:
+            booster = self.model.get_booster()
+            contrib = booster.predict(xgb.DMatrix(X, feature_names=booster.feature_names), pred_contribs=True)
+        return np.asarray(contrib).reshape(X.shape[0], -1, X.shape[1] + 1)
+
+    def output(self, raw):
+        """Turn raw scores, shape (..., n_samples, n_outputs), into predict_proba or predict output."""
+        if self.link == "softmax":
+            raw = np.exp(raw - raw.max(axis=-1, keepdims=True))
+            return raw / raw.sum(axis=-1, keepdims=True)
+        raw = raw[..., 0]
+        if self.link == "sigmoid":
+            prediction = 1.0 / (1.0 + np.exp(-self.link_scale * raw))
+        elif self.link == "exp":
+            prediction = np.exp(raw)
+        else:
+            prediction = raw
+        if self.data_type == "Classification":
+            return np.stack([1.0 - prediction, prediction], axis=-1)
+        return prediction
+
+    def relative_loss_changes(self, mask, loss):
+        """Return the estimated relative loss change, against loss, of dropping each feature from mask."""
+        contrib = self.contributions(mask)
+        raw = contrib.sum(axis=-1)
+        base = self.estimated_losses(self.output(raw)[None])[0]
+        n_features = contrib.shape[-1] - 1
+        changes = np.empty(n_features)
+        chunk = max(1, self.max_cells // max(raw.size, 1))
+        for start in range(0, n_features, chunk):
+            features = np.arange(start, min(start + chunk, n_features))
+            dropped = raw[None] - np.moveaxis(contrib[..., features], -1, 0)
+            changes[features] = self.estimated_losses(self.output(dropped)) - base
+        return changes / max(loss, 1e-5)
+
+    def estimated_losses(self, preds):
+        return batch_losses(preds, self.y, self.data_type, self.classes)
+
+
+def _link_for(objective):
+    if objective in SIGMOID_OBJECTIVES:
+        return "sigmoid", 1.0
+    if objective in IDENTITY_OBJECTIVES:
+        return "identity", 1.0
+    if objective in EXP_OBJECTIVES:
+        return "exp", 1.0
+    raise NotImplementedError(f"Unsupported objective {objective}")
+
+
+def _walk_lightgbm(node, nodes):
+    """Append a LightGBM dump_model() node and its subtree to nodes in preorder; return its index."""
+    idx = len(nodes)
+    if "split_feature" not in node:
+        nodes.append({"value": node["leaf_value"]})
+        return idx
+    if node["decision_type"] != "<=":
+        raise NotImplementedError("Categorical splits are not supported")
+    record = {"feature": node["split_feature"], "threshold": node["threshold"],
+              "default_left": node["default_left"],
+              "missing_type": {"None": MISSING_NONE, "Zero": MISSING_ZERO, "NaN": MISSING_NAN}[node["missing_type"]]}
+    nodes.append(record)
+    record["left"] = _walk_lightgbm(node["left_child"], nodes)
+    record["right"] = _walk_lightgbm(node["right_child"], nodes)
+    return idx
+
+
+def _walk_xgboost(node, nodes, feature_index):
+    """Append an XGBoost JSON dump node and its subtree to nodes in preorder; return its index."""
+    idx = len(nodes)
+    if "leaf" in node:
+        nodes.append({"value": node["leaf"]})
+        return idx
+    if "split_condition" not in node:
+        raise NotImplementedError("Categorical splits are not supported")
+    split = node["split"]
+    feature = feature_index[split] if split in feature_index else int(split.lstrip("f"))
+    children = {child["nodeid"]: child for child in node["children"]}
+    record = {"feature": feature, "threshold": node["split_condition"],
+              "default_left": node["missing"] == node["yes"], "missing_type": MISSING_NAN}
+    nodes.append(record)
+    record["left"] = _walk_xgboost(children[node["yes"]], nodes, feature_index)
+    record["right"] = _walk_xgboost(children[node["no"]], nodes, feature_index)
+    return idx
+
+
+def _usage_lightgbm(node, tree_idx, feature_nodes, total_gain):
+    if "split_feature" in node:
+        feature_nodes[node["split_feature"]].append((tree_idx, node["split_index"]))
+        total_gain[node["split_feature"]] += node["split_gain"]
+        _usage_lightgbm(node["left_child"], tree_idx, feature_nodes, total_gain)
+        _usage_lightgbm(node["right_child"], tree_idx, feature_nodes, total_gain)
+
+
+def _usage_xgboost(node, tree_idx, feature_nodes, total_gain, feature_index):
+    if "split" in node:
+        split = node["split"]
+        feature = feature_index[split] if split in feature_index else int(split.lstrip("f"))
+        feature_nodes[feature].append((tree_idx, node["nodeid"]))
+        total_gain[feature] += node["gain"]
+        for child in node["children"]:
+            _usage_xgboost(child, tree_idx, feature_nodes, total_gain, feature_index)
@@ -0,0 +1,127 @@
+import json
+import warnings
+
+import numpy as np
+import xgboost as xgb
+from sklearn.base import BaseEstimator, clone, is_classifier
+from sklearn.metrics import accuracy_score, r2_score
+from sklearn.model_selection import KFold, ParameterGrid, ParameterSampler, StratifiedKFold
+
+from Models.Resource_Manager import thread_budget
+
+# Whether XGBoost can train on a CUDA device, probed on first use
+_cuda_available = None
+
+
+def cuda_available():
+    """Return whether XGBoost trains on a CUDA device on this machine.
+
+    CUDA builds of XGBoost fall back to the CPU, with a warning, when no GPU is visible, so a one-round booster is
+    trained on "cuda" and its configuration checked.
+    """
+    global _cuda_available
+    if _cuda_available is None:
+        _cuda_available = False
+        if xgb.build_info().get("USE_CUDA"):
+            try:
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore")
+                    booster = xgb.train({"device": "cuda", "tree_method": "hist"},
+                                        xgb.DMatrix(np.zeros((2, 1)), label=[0.0, 1.0]), num_boost_round=1)
+                config = json.loads(booster.save_config())
+                _cuda_available = config["learner"]["generic_param"]["device"].startswith("cuda")
+            except xgb.core.XGBoostError:
+                pass
+    return _cuda_available
+
+
+def device_params(params):
+    """Return params completed with the device, tree method and threads for this machine.
+
+    Training uses the hist tree method, on the GPU when cuda_available() and otherwise on the CPU with all the cores
+    of thread_budget, which hyperparameter searches split between their parallel fits. Keys already in params win.
+    """
+    if cuda_available():
+        defaults = {"device": "cuda", "tree_method": "hist"}
+    else:
+        defaults = {"device": "cpu", "tree_method": "hist", "n_jobs": thread_budget.n_cores}
+    return {**defaults, **params}
+
+
+def booster_params(estimator, n_classes=None):
+    """Translate the parameters of an XGBClassifier/XGBRegressor into xgb.train parameters and boosting rounds."""
+    params = {key: value for key, value in estimator.get_xgb_params().items() if value is not None}
+    if is_classifier(estimator) and n_classes > 2:
+        params["objective"] = "multi:softprob"
+        params["num_class"] = n_classes
+    return params, estimator.get_num_boosting_rounds()
+
+
+class NativeXGBoostSearchCV(BaseEstimator):
+    """Random or grid search over XGBoost parameters with xgb.train on folds shared by all configurations.
+
+    Configurations are sampled and scored like RandomizedSearchCV (the estimator's default score, accuracy or R^2,
+    averaged over cv stratified or plain folds), or with n_iter=None taken from the full grid like GridSearchCV, but
+    the training QuantileDMatrix of every fold is built once per max_bin and trained with xgb.train, and held-out
+    rows are predicted with inplace_predict, without cloning and validating a scikit-learn estimator per fit.
+    eval_set only monitors XGBoost fits, so it is only passed to the refit. Trials run one at a time, each with the
+    threads of all n_jobs search jobs. Exposes best_params_, best_score_, best_estimator_ and cv_results_ like the
+    scikit-learn searches.
+    """
+
+    def __init__(self, estimator, param_distributions, n_iter=15, cv=5, n_jobs=None, random_state=None):
+        self.estimator = estimator
+        self.param_distributions = param_distributions
+        self.n_iter = n_iter
+        self.cv = cv
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+
+    def fit(self, X, y, **fit_params):
+        classifier = is_classifier(self.estimator)
+        if classifier:
+            classes, labels = np.unique(np.asarray(y).ravel(), return_inverse=True)
+        else:
+            classes, labels = None, np.asarray(y).ravel()
+        splitter = StratifiedKFold(self.cv) if classifier else KFold(self.cv)
+        X_array = np.asarray(X)
+        folds = list(splitter.split(X_array, labels))
+        # (fold, max_bin) -> quantized training rows of the fold, shared by the configurations of the search
+        fold_matrices = {}
+        estimator_threads = self.estimator.get_params().get("n_jobs") or -1
+        threads = estimator_threads * self.n_jobs if estimator_threads > 0 and (self.n_jobs or 0) > 0 else -1
+
+        if self.n_iter is None:
+            candidates = list(ParameterGrid(self.param_distributions))
+        else:
+            candidates = list(ParameterSampler(self.param_distributions, self.n_iter, random_state=self.random_state))
+        mean_scores = []
+        for candidate in candidates:
+            params, num_boost_round = booster_params(clone(self.estimator).set_params(**candidate),
+                                                     len(classes) if classifier else None)
+            params["n_jobs"] = threads
+            scores = []
+            max_bin = params.get("max_bin", 256)
+            for fold, (train_idx, test_idx) in enumerate(folds):
+                if (fold, max_bin) not in fold_matrices:
+                    fold_matrices[fold, max_bin] = xgb.QuantileDMatrix(X_array[train_idx], labels[train_idx],
+                                                                       max_bin=max_bin)
+                booster = xgb.train(params, fold_matrices[fold, max_bin], num_boost_round=num_boost_round)
+                preds = booster.inplace_predict(X_array[test_idx])
+                if not classifier:
+                    scores.append(r2_score(labels[test_idx], preds))
+                elif preds.ndim == 1:
+                    scores.append(accuracy_score(labels[test_idx], preds > 0.5))
+                else:
+                    scores.append(accuracy_score(labels[test_idx], np.argmax(preds, axis=1)))
+            mean_scores.append(float(np.mean(scores)))
+
+        best = int(np.argmax(mean_scores))
+        self.cv_results_ = {"params": candidates, "mean_test_score": np.array(mean_scores)}
+        self.best_index_ = best
+        self.best_params_ = candidates[best]
+        self.best_score_ = mean_scores[best]
+        # The refit goes through the scikit-learn wrapper, on the data as given, so that callers get the usual fitted
+        # estimator
+        self.best_estimator_ = clone(self.estimator).set_params(**self.best_params_).fit(X, y, **fit_params)
+        return self